@@ -1,16 +1,45 @@
 from __future__ import annotations
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Set
 import frappe
-from frappe.utils import now_datetime, cint, cstr
+from frappe.model.naming import make_autoname
+from frappe.utils import now_datetime
+from frappe.utils.caching import site_cache
 import json
 
+try:  # Frappe ile birlikte gelir; yoksa stdlib json'a düşülür
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+_LOG_DT = "AI Interaction Log"
+
+# write() satırları Redis listesine atar; flush() bunları tek INSERT ile yazar
+_QUEUE_KEY = "brv_license_app:ai_log_queue"
+_FLUSH_THRESHOLD = 200   # Kuyrukta bu kadar satır birikince flush arka plana atılır
+_FLUSH_BATCH = 1000      # Tek flush çağrısında yazılacak en fazla satır
+_FLUSH_LOCK_KEY = "brv_license_app:ai_log_flush_lock"  # Aynı satırları iki flush birden yazmasın
+_FLUSH_LOCK_TIMEOUT = 300
+
+_SAVEPOINT = "ai_log_write"  # Tekil insert hatası dış transaction'ı bozmasın
+
+_ROW_FIELDS = ("subject", "ticket", "event_timestamp", "request", "response", "error_message")
+_INSERT_FIELDS = ("name", "owner", "modified_by", "creation", "modified", "docstatus", *_ROW_FIELDS)
+
+# Anahtar sıralaması yok: log yalnızca eklenir, kolon arama anahtarı değil; ekleme sırası yeterli
+_ORJSON_OPTS = orjson.OPT_NON_STR_KEYS if orjson else 0
+
 
 # ----------------------------------------------------------------------------
 # Helpers
 # ----------------------------------------------------------------------------
 
+@site_cache(ttl=30, maxsize=2048)
 def _safe_get_ticket_subject(ticket: str | None) -> str:
-    """HD Ticket başlığını güvenli biçimde al (yoksa boş döner)."""
+    """HD Ticket başlığını güvenli biçimde al (yoksa boş döner).
+    Aynı ticket için art arda gelen log yazımlarında DB'ye tekrar gitmemek için
+    site bazında 30 sn önbelleklenir; başlık sadece log subject'inde kullanılır.
+    """
     if not ticket:
         return ""
     try:
@@ -19,46 +48,34 @@ def _safe_get_ticket_subject(ticket: str | None) -> str:
         return ""
 
 
+def _dumps(obj: Any) -> str:
+    """Request/response için kompakt JSON (log satırı makine tarafından okunur, girinti yok)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=_ORJSON_OPTS).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
 def _summarize_updates(request: Dict[str, Any] | None, result: Dict[str, Any] | None) -> str:
     """Güncellenen alanları kısa özet olarak üret (subject’e eklenecek)."""
-    keys: List[str] = []
-    try:
-        if isinstance(request, dict):
-            keys.extend([k for k in request.keys()])
-        if isinstance(result, dict):
-            for k in ("changed", "preview"):  # preview artık yazılmıyor ama konu özeti için korunur
-                if isinstance(result.get(k), dict):
-                    keys.extend(list(result[k].keys()))
-    except Exception:
-        pass
-    keys = sorted(set(keys))
+    keys: Set[str] = set()
+    if isinstance(request, dict):
+        keys.update(request)
+    if isinstance(result, dict):
+        for k in ("changed", "preview"):  # preview artık yazılmıyor ama konu özeti için korunur
+            v = result.get(k)
+            if isinstance(v, dict):
+                keys.update(v)
     if not keys:
         return ""
     if len(keys) > 4:
-        return f"fields: {', '.join(keys[:4])}…"
-    return f"fields: {', '.join(keys)}"
-
+        return f"fields: {', '.join(sorted(keys)[:4])}…"
+    return f"fields: {', '.join(sorted(keys))}"
 
-def _compose_subject(*, ticket: str | int, action: str, request: Dict[str, Any] | None, result: Dict[str, Any] | None) -> str:
-    """Anlamlı ve tutarlı subject oluşturur. (status/source/preview kaldırıldı)"""
-    tnum = cstr(ticket).strip()
-    ticket_subject = _safe_get_ticket_subject(tnum)
-    parts: List[str] = []
 
-    # İşlem + Ticket No
-    parts.append(f"{action} — T#{tnum}")
-
-    # İsteğe bağlı ticket başlığı
-    if ticket_subject:
-        parts.append(f"— {ticket_subject}")
-
-    # Güncellenen alanlar özeti
-    upd = _summarize_updates(request, result)
-    if upd:
-        parts.append(f"({upd})")
-
-    subject = " ".join([p for p in parts if p]).strip() or f"{action} — {tnum}"
-    return subject[:140]
+def _format_subject(action: str, tnum: str, ts: str, upd: str) -> str:
+    """İşlem + Ticket No, isteğe bağlı ticket başlığı ve güncellenen alanlar özeti."""
+    subject = f"{action} — T#{tnum}{' — ' + ts if ts else ''}{' (' + upd + ')' if upd else ''}"
+    return subject.strip()[:140]
 
 
 # ----------------------------------------------------------------------------
@@ -104,36 +121,179 @@ def write(
       DocType alanları: subject, ticket (Int), event_timestamp (Datetime),
                         request (Text), response (Text), error_message (Text)
     Eski parametreler (status/source/preview/direction/meta/user/ip) kaldırıldı.
+    Satır doğrudan insert edilmez; Redis kuyruğuna atılır ve flush() ile toplu yazılır.
+    Çağıran taraf hiçbir DB işlemi beklemez: ticket başlığı da flush sırasında toplu okunur.
+
+    Dönüş: önceden üretilmiş (bekleyen) kayıt adı. Redis kullanılabiliyorsa satır bu anda
+    henüz tabloda YOKTUR; bir sonraki flush() ile bu isimle oluşur. Redis yoksa satır hemen
+    yazılır.
     """
     try:
-        doc = frappe.new_doc("AI Interaction Log")
-        doc.ticket = cint(ticket) if str(ticket).isdigit() else ticket  # Int veya name
+        user = getattr(frappe.session, "user", None) or "Administrator"
+        # Int veya name: sayısal string doğrudan int olur (cint dolaşmadan)
+        if isinstance(ticket, str) and ticket.isdecimal():
+            ticket = int(ticket)
+        row: Dict[str, Any] = {
+            "name": make_autoname("hash", _LOG_DT),
+            "owner": user,
+            "modified_by": user,
+            "docstatus": 0,
+            "ticket": ticket,
+            # Timestamp (always set by server)
+            "event_timestamp": event_timestamp or now_datetime(),
+            "error_message": str(error_message) if error_message else None,
+        }
+
+        # Subject — verilen değeri kullan; yoksa flush'ta oluşturulmak üzere parçalarını sakla
+        row["subject"] = (subject or "").strip() or None
+        if not row["subject"]:
+            row["_subject"] = (action, _summarize_updates(request, response))
+
+        # JSON'ları metin alanlarına serileştir
+        try:
+            row["request"] = _dumps(request or {})
+        except Exception:
+            row["request"] = str(request) if request else ""
+        try:
+            row["response"] = _dumps(response or {})
+        except Exception:
+            row["response"] = str(response) if response else ""
+
+        # Kuyruğa at; Redis yoksa eski yol (savepoint içinde tekil insert)
+        try:
+            _queue_row(row)
+        except Exception:
+            _fill_subjects([row])
+            frappe.db.savepoint(_SAVEPOINT)
+            try:
+                _insert_row(row)
+            except Exception:
+                frappe.db.rollback(save_point=_SAVEPOINT)
+                raise
+            _commit()
+        # İsim önceden üretildi; satır flush ile aynı isimle yazılır
+        return row["name"]
+    except Exception as e:
+        frappe.log_error(f"ai_log.write failed: {e}", "HelpdeskAI")
+        raise
+
+
+# ----------------------------------------------------------------------------
+# Buffered insert
+# ----------------------------------------------------------------------------
 
-        # Subject — verilen değeri kullan; yoksa akıllı oluşturucu
-        doc.subject = (subject or "").strip() or _compose_subject(
-            ticket=doc.ticket, action=action, request=request, result=response
+def _queue_row(row: Dict[str, Any]) -> None:
+    """Satırı Redis kuyruğuna ekler; eşik dolunca flush işini arka plana atar."""
+    cache = frappe.cache()
+    cache.rpush(_QUEUE_KEY, json.dumps(row, ensure_ascii=False, default=str))
+    if cache.llen(_QUEUE_KEY) < _FLUSH_THRESHOLD:
+        return
+    try:
+        frappe.enqueue(
+            "brv_license_app.api.ai_log.flush",
+            queue="short",
+            job_id=_QUEUE_KEY,
+            deduplicate=True,
         )
+    except Exception:
+        # Satır zaten kuyrukta; scheduler'daki flush onu alır
+        pass
 
-        # Timestamp (always set by server)
-        doc.event_timestamp = event_timestamp or now_datetime()
 
-        # JSON'ları metin alanlarına serileştir
+def _commit() -> None:
+    """HTTP isteği içinde commit'i istek sonuna bırakır (GET dahil); worker/CLI'de hemen commit eder."""
+    if getattr(frappe.local, "request", None) is not None:
+        frappe.local.flags.commit = True
+        return
+    frappe.db.commit()
+
+
+def _insert_row(row: Dict[str, Any]) -> str:
+    """Tek satırı ORM üzerinden yazar (kuyruk/toplu insert başarısızsa yedek yol)."""
+    doc = frappe.get_doc({"doctype": _LOG_DT, **{f: row.get(f) for f in _ROW_FIELDS}})
+    doc.creation = row.get("event_timestamp")  # insert boşsa şimdiki zamanı koyar
+    doc.insert(ignore_permissions=True, set_name=row.get("name"))
+    return doc.name
+
+
+def _fill_subjects(rows: List[Dict[str, Any]]) -> None:
+    """Subject'i boş satırlar için ticket başlıklarını tek sorguyla alıp subject üretir."""
+    pending = [r for r in rows if r.get("_subject")]
+    if not pending:
+        return
+    tickets = {str(r["ticket"]).strip() for r in pending if r.get("ticket") not in (None, "")}
+    titles: Dict[str, str] = {}
+    if len(tickets) == 1:
+        (t,) = tickets
+        titles[t] = _safe_get_ticket_subject(t)
+    elif tickets:
         try:
-            doc.request = json.dumps(request or {}, ensure_ascii=False, indent=2, sort_keys=True)
+            for name, subj in frappe.get_all(
+                "HD Ticket",
+                filters={"name": ("in", list(tickets))},
+                fields=["name", "subject"],
+                as_list=True,
+            ):
+                titles[str(name)] = (subj or "").strip()
         except Exception:
-            doc.request = cstr(request or "")
+            pass
+    for r in pending:
+        action, upd = r.pop("_subject")
+        tnum = "" if r.get("ticket") is None else str(r["ticket"]).strip()
+        r["subject"] = _format_subject(action, tnum, titles.get(tnum, ""), upd)
+
+
+def flush() -> int:
+    """Kuyruktaki AI Interaction Log satırlarını tek INSERT ile yazar, batch başına bir commit.
+    scheduler_events["all"] ve kuyruk eşiği tarafından tetiklenir; yazılan satır sayısını döner.
+
+    Satırlar kuyruktan commit başarılı olduktan SONRA silinir (lrange + ltrim): worker
+    insert ile commit arasında ölürse satırlar kuyrukta kalır ve sonraki flush yeniden dener.
+    Aynı anda tek flush çalışır; diğeri hiçbir şey yapmadan 0 döner.
+    """
+    cache = frappe.cache()
+    lock = cache.lock(cache.make_key(_FLUSH_LOCK_KEY), timeout=_FLUSH_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        return _flush_batch(cache)
+    finally:
         try:
-            doc.response = json.dumps(response or {}, ensure_ascii=False, indent=2, sort_keys=True)
+            lock.release()
         except Exception:
-            doc.response = cstr(response or "")
+            pass  # Kilit süresi dolmuşsa zaten serbest
 
-        if error_message:
-            doc.error_message = cstr(error_message)
 
-        # Insert atomically; return created name for observability
-        doc.insert(ignore_permissions=True)
+def _flush_batch(cache) -> int:
+    raws = cache.lrange(_QUEUE_KEY, 0, _FLUSH_BATCH - 1) or []
+    if not raws:
+        return 0
+    rows: List[Dict[str, Any]] = [json.loads(raw) for raw in raws]
+
+    _fill_subjects(rows)
+    # creation/modified olayın zamanıdır (flush anı değil)
+    for r in rows:
+        r["creation"] = r["modified"] = r.get("event_timestamp") or now_datetime()
+    try:
+        frappe.db.bulk_insert(
+            _LOG_DT,
+            fields=list(_INSERT_FIELDS),
+            values=[tuple(r.get(f) for f in _INSERT_FIELDS) for r in rows],
+        )
         frappe.db.commit()
-        return doc.name
     except Exception as e:
-        frappe.log_error(f"ai_log.write failed: {e}", "HelpdeskAI")
-        raise
+        frappe.db.rollback()
+        frappe.log_error(f"ai_log.flush bulk insert failed: {e}", "HelpdeskAI")
+        for r in rows:
+            frappe.db.savepoint(_SAVEPOINT)
+            try:
+                _insert_row(r)
+            except Exception as row_err:
+                # Bozuk (ya da çakışan isimli) satır tek başına geri alınır ve raporlanır;
+                # kalan satırlar aynı transaction'da yazılır
+                frappe.db.rollback(save_point=_SAVEPOINT)
+                frappe.log_error(f"ai_log.flush row insert failed ({r.get('name')}): {row_err}", "HelpdeskAI")
+        frappe.db.commit()
+    # Yalnızca commit sonrası: yazılan satırları kuyruktan düşür
+    cache.ltrim(_QUEUE_KEY, len(raws), -1)
+    return len(rows)
@@ -1,18 +1,92 @@
 from __future__ import annotations
-import re, frappe
+import frappe
 
-# TR (1–2): HTML etiketlerini silmek için basit ve güvenli regex
-_TAG_RE = re.compile(r"(?is)</?[^<>]+?>")
+try:  # TR: Frappe ile birlikte gelir; yoksa gövde frappe.parse_json ile çözülür
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+def _strip_tags(s: str) -> str:
+    # TR (1–2): <...> etiketlerini tek geçişte sil; str.find/rfind C seviyesinde tarar
+    # TR: Etiket = boş olmayan, içinde '<' veya '>' bulunmayan <...> bloğu ("<>" silinmez)
+    # TR: Geri izleme yok; her karakter en fazla bir kez find + bir kez rfind ile taranır (doğrusal)
+    i = s.find("<")
+    if i < 0:
+        return s
+    find, rfind = s.find, s.rfind                    # TR: Döngüde tekrar attribute araması yapılmasın
+    parts = []
+    append = parts.append
+    pos = 0
+    while i >= 0:
+        j = find(">", i + 1)
+        if j < 0:
+            break                                    # TR: Kapanmayan '<' kalmışsa tarama biter
+        k = rfind("<", i, j)                         # TR: '>' öncesindeki son '<' etiketin başıdır
+        if j - k > 1:
+            append(s[pos:k])
+            pos = j + 1
+        i = find("<", j + 1)
+    if not parts:
+        return s
+    append(s[pos:])
+    return "".join(parts)
 
 def _clean(obj):
-    # TR (5–15): JSON'u aynen dolaş; string ise tag'leri sil, diğer tiplere dokunma
+    # TR (5–15): JSON'u özyinelemesiz dolaş; string ise tag'leri sil, diğer tiplere dokunma
+    # TR: Kaplar (list/dict) yerinde güncellenir; yalnızca değişen string'ler geri yazılır
     if isinstance(obj, str):
-        return _TAG_RE.sub("", obj)                  # TR: Sadece <...> etiketlerini kaldır
-    if isinstance(obj, list):
-        return [_clean(x) for x in obj]              # TR: Liste elemanlarını temizle
-    if isinstance(obj, dict):
-        return {k: _clean(v) for k, v in obj.items()}# TR: Sözlük değerlerini temizle
-    return obj                                       # TR: Sayılar, null vs. aynen dön
+        if "<" not in obj:                           # TR: Etiketsiz metin (yaygın durum) için hızlı yol
+            return obj
+        return _strip_tags(obj)                      # TR: Sadece <...> etiketlerini kaldır
+    if not isinstance(obj, (list, dict)):
+        return obj                                   # TR: Sayılar, null vs. aynen dön
+    stack = [obj]
+    seen = set()                                     # TR: Döngüsel referanslara karşı id() kümesi
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        for k, v in (node.items() if isinstance(node, dict) else enumerate(node)):
+            t = type(v)                              # TR: JSON tipleri için tam tip karşılaştırması (isinstance'tan ucuz)
+            if t is str:
+                if "<" not in v:                     # TR: Tarayıcı çağrısına hiç girmeden geç
+                    continue
+                cleaned = _strip_tags(v)
+                if cleaned is not v:                 # TR: Etiket yoksa aynı nesne döner; yazma yok
+                    node[k] = cleaned
+            elif t is dict or t is list:
+                stack.append(v)
+            elif t is int or t is float or t is bool or v is None:
+                continue                             # TR: Skalerler (en sık durum) için isinstance'a inme
+            elif isinstance(v, str):                 # TR: Alt sınıflar (frappe._dict vb.) için yedek yol
+                cleaned = _strip_tags(v)
+                if cleaned is not v:
+                    node[k] = cleaned
+            elif isinstance(v, (list, dict)):
+                stack.append(v)
+    return obj
+
+# TR: Ham JSON gövdesinde '<' (ya da \u003c kaçışı) yoksa hiçbir string'de etiket olamaz
+_LT = ("<", "\\u003c", "\\u003C")
+_LT_BYTES = tuple(n.encode() for n in _LT)
+
+def _may_have_tags(raw) -> bool:
+    # TR: Gövde üzerinde C seviyesinde (memchr) tek tarama; ağaç dolaşımından çok daha ucuz
+    needles = _LT_BYTES if isinstance(raw, (bytes, bytearray)) else _LT
+    return any(n in raw for n in needles)
+
+def _loads(raw):
+    # TR: str/bytes gövdeyi orjson ile çöz; zaten çözülmüş değerler (dict/list) parse_json'a kalır
+    if orjson is not None and isinstance(raw, (str, bytes, bytearray)):
+        try:
+            return orjson.loads(raw)                 # TR: bytes doğrudan; ayrı decode kopyası yok
+        except orjson.JSONDecodeError:
+            # TR: orjson'un reddettiği ama json modülünün kabul ettiği gövdeler (NaN, Infinity,
+            # TR: 64 bit üstü tamsayılar) ve geçersiz UTF-8 eskisi gibi frappe.parse_json'a düşer
+            if isinstance(raw, (bytes, bytearray)):
+                raw = raw.decode("utf-8", "ignore")  # TR: Geçersiz UTF-8 baytları yok sayılır
+    return frappe.parse_json(raw)
 
 @frappe.whitelist(allow_guest=False)
 def strip_tags_json():
@@ -21,13 +95,15 @@ def strip_tags_json():
     ve yapıyı değiştirmeden geri döner. Sadece <...> etiketleri silinir.
     """
     raw = getattr(frappe.request, "data", None)
-    if isinstance(raw, bytes):
-        raw = raw.decode("utf-8", "ignore")
+    if isinstance(raw, bytes) and orjson is None:
+        raw = raw.decode("utf-8", "ignore")          # TR: orjson bytes'ı kendisi çözer
     if raw and raw.strip():
-        data = frappe.parse_json(raw)
+        data = _loads(raw)
+        if _may_have_tags(raw):                      # TR: Etiketsiz gövdede _clean dolaşımı atlanır
+            data = _clean(data)
     else:
         # Body boşsa query/form'dan 'data' paramını dene (opsiyonel)
         data_param = frappe.form_dict.get("data")
-        data = frappe.parse_json(data_param) if data_param else {}
+        data = _clean(_loads(data_param)) if data_param else {}
 
-    return _clean(data)
+    return data
@@ -10,12 +10,23 @@ NOT: Güvenlik için ileride API Key/Secret eklenecek. Şimdilik açık (allow_g
 from __future__ import annotations
 
 # (1) Tipler ve yardımcılar
-from typing import Any, Dict, List, Iterable
+from typing import Any, Callable, Dict, List, Iterable, Tuple
+import base64
 import json
 import re
 
 import frappe
 from frappe.utils import cint, flt, cstr
+from frappe.utils.caching import site_cache
+
+try:  # İstek parametrelerindeki JSON'u C hızında çöz (Frappe ile gelir); yoksa stdlib
+    from orjson import loads as _loads
+except ImportError:  # pragma: no cover
+    _loads = json.loads
+
+# Meta'dan türetilen alan listeleri site bazında önbelleklenir; DocType/Custom Field
+# değişiklikleri en geç bu sürede yansır (clear_cache hook'u ve doc_events anında temizler)
+_META_TTL = 300
 
 # --- AI Interaction Log (MERKEZİ) -------------------------------------------
 # Merkezi yazıcı – json modeline uyumlu versiyon
@@ -23,20 +34,30 @@ from frappe.utils import cint, flt, cstr
 # Yardımcılar
 # ---------------------------------------------------------------------------
 
+# HTML temizleyici import anında bir kez çözülür (her çağrıda import denemesi yok)
+try:  # Frappe 14/15
+    from frappe.utils import strip_html as _strip_html
+except ImportError:
+    try:
+        from frappe.utils import strip_html_tags as _strip_html
+    except ImportError:
+        _strip_html = None
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
 def _clean_html(text: str) -> str:
     """HTML/etiket temizleme (metni bozma)."""
     if text is None:
         return ""
-    try:
-        # Frappe 14/15
-        from frappe.utils import strip_html
-        return strip_html(text)
-    except Exception:
+    if isinstance(text, str) and "<" not in text:
+        return text  # Etiketsiz metin (yaygın durum) hiç taranmaz
+    if _strip_html is not None:
         try:
-            from frappe.utils import strip_html_tags
-            return strip_html_tags(text)
+            return _strip_html(text)
         except Exception:
-            return re.sub(r"<[^>]+>", "", cstr(text))
+            pass
+    return _TAG_RE.sub("", cstr(text))
 
 
 def _get_doc(doctype: str, name: str):
@@ -46,6 +67,31 @@ def _get_doc(doctype: str, name: str):
     return doc
 
 
+def _commit_if_needed() -> None:
+    """HTTP isteğinde commit'i istek sonuna bırakır (Frappe başarılı yanıtta tek seferde commit eder);
+    worker/console gibi istek dışı çağrılarda hemen commit eder."""
+    if getattr(frappe.local, "request", None) is not None:
+        frappe.local.flags.commit = True
+        return
+    frappe.db.commit()
+
+
+def _validate_links_bulk(link_map: Dict[str, Iterable[Any]]) -> None:
+    """Link değerlerini doctype başına tek `IN (...)` sorgusuyla doğrular (alan başına exists yok)."""
+    for doctype, values in link_map.items():
+        wanted = {cstr(v) for v in values if v}
+        if not wanted:
+            continue
+        # MariaDB name karşılaştırması harf duyarsız; exists() ile aynı sonucu vermek için casefold
+        found = {
+            cstr(n).casefold()
+            for n in frappe.get_all(doctype, filters={"name": ["in", list(wanted)]}, pluck="name")
+        }
+        missing = sorted(v for v in wanted if v.casefold() not in found)
+        if missing:
+            frappe.throw(f"Linked doc not found: {doctype} {missing[0]}")
+
+
 def _parse_fields_arg(fields: Any) -> Dict[str, Any]:
     """fields parametresi string JSON geldiyse dict'e çevirir."""
     if isinstance(fields, (dict, list)):
@@ -57,14 +103,82 @@ def _parse_fields_arg(fields: Any) -> Dict[str, Any]:
         if not fields:
             return {}
         try:
-            return json.loads(fields)
+            return _loads(fields)
         except Exception:
             frappe.throw("Invalid JSON for `fields`")
     return {}
 
 
 def _pluck(lst: Iterable[Dict[str, Any]], key: str) -> List[Any]:
-    return [r.get(key) for r in lst or [] if r.get(key)]
+    return [v for r in lst or [] if (v := r.get(key))]
+
+
+@site_cache(ttl=_META_TTL, maxsize=64)
+def _columns(doctype: str) -> frozenset[str]:
+    """Tablo kolonları (site bazında önbellekli); tablo yoksa boş küme."""
+    try:
+        return frozenset(frappe.db.get_table_columns(doctype))
+    except Exception:
+        return frozenset()
+
+
+# --- Cursor sayfalama --------------------------------------------------------
+# Liste uç noktaları (modified, name) bileşik anahtarıyla azalan sıralanır. `cursor`
+# verilirse OFFSET yerine anahtar karşılaştırması yapılır; derin sayfalarda satır
+# atlanmaz ve araya eklenen kayıtlar sayfaları kaydırmaz. `start` geriye dönük destek.
+
+_PAGE_ORDER = "modified desc, name desc"
+
+
+def _encode_cursor(row: Dict[str, Any]) -> str:
+    """Sayfanın son satırından base64url {"m": modified, "n": name} cursor üretir."""
+    raw = json.dumps({"m": cstr(row.get("modified")), "n": cstr(row.get("name"))}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return cstr(data["m"]), cstr(data["n"])
+    except Exception:
+        frappe.throw("Invalid `cursor`")
+
+
+def _split_page(rows: List[Dict[str, Any]], limit: int) -> Tuple[List[Dict[str, Any]], str | None]:
+    """limit+1 ile çekilen satırları sayfaya böler; fazladan satır varsa next_cursor döner."""
+    if limit > 0 and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, _encode_cursor(rows[-1])
+    return rows, None
+
+
+def _paged_get_all(
+    doctype: str,
+    *,
+    fields: List[str],
+    filters: Dict[str, Any],
+    limit: int,
+    start: int,
+    cursor: str | None,
+) -> Tuple[List[Dict[str, Any]], str | None]:
+    limit = cint(limit)
+    or_filters = None
+    if cursor:
+        m, n = _decode_cursor(cursor)
+        # (modified, name) < (m, n)  ≡  modified <= m AND (modified < m OR name < n)
+        filters = {**filters, "modified": ["<=", m]}
+        or_filters = [["modified", "<", m], ["name", "<", n]]
+        start = 0
+    rows = frappe.get_all(
+        doctype,
+        fields=fields,
+        filters=filters,
+        or_filters=or_filters,
+        limit_start=start,
+        limit_page_length=limit + 1 if limit > 0 else 0,
+        order_by=_PAGE_ORDER,
+    )
+    return _split_page(rows, limit)
 
 
 # ---------------------------------------------------------------------------
@@ -75,25 +189,36 @@ def _pluck(lst: Iterable[Dict[str, Any]], key: str) -> List[Any]:
 def get_teams(include_members: int | bool = 0, include_tags: int | bool = 0):
     # Takım listesi, opsiyonel üye detayları
     doctype = "HD Team"
-    fields = ["name"]
-    if frappe.db.has_column(doctype, "team_name"):
-        fields.append("team_name")
-    if frappe.db.has_column(doctype, "description"):
-        fields.append("description")
-
-    teams = frappe.get_all(doctype, fields=fields, order_by="modified desc")
-
-    if cint(include_members):
-        child_dt = "HD Team Member"
-        user_field = "user"
-        if frappe.db.table_exists(child_dt):
-            by_team = frappe.get_all(child_dt, fields=["parent", user_field], limit=10000)
-            members_map: Dict[str, List[str]] = {}
-            for row in by_team:
-                members_map.setdefault(row["parent"], []).append(row[user_field])
-            for t in teams:
-                t["members"] = members_map.get(t["name"], [])
-        else:
+    cols = _columns(doctype)
+    fields = ["name"] + [f for f in ("team_name", "description") if f in cols]
+
+    if cint(include_members) and _columns("HD Team Member"):
+        # Takımlar + üyeler tek LEFT JOIN ile; satırlar sıralı geldiği için tek geçişte gruplanır
+        select = ", ".join(f"t.`{f}`" for f in fields)
+        rows = frappe.db.sql(
+            f"""
+            SELECT {select}, m.`user` AS `_member`
+            FROM `tabHD Team` t
+            LEFT JOIN `tabHD Team Member` m
+                ON m.parent = t.name AND m.parenttype = 'HD Team'
+            ORDER BY t.modified DESC, t.name, m.idx
+            """,
+            as_dict=True,
+        )
+        teams: List[Dict[str, Any]] = []
+        by_name: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            member = row.pop("_member")
+            team = by_name.get(row["name"])
+            if team is None:
+                row["members"] = []
+                team = by_name[row["name"]] = row
+                teams.append(team)
+            if member:
+                team["members"].append(member)
+    else:
+        teams = frappe.get_all(doctype, fields=fields, order_by="modified desc")
+        if cint(include_members):
             for t in teams:
                 t["members"] = []
 
@@ -106,11 +231,25 @@ def get_team_members(team: str) -> Dict[str, Any]:
     """Tek takımın üyeleri."""
     members = frappe.get_all(
         "HD Team Member",
-        fields=["user"],
         filters={"parent": team, "parenttype": "HD Team"},
         order_by="idx asc",
+        pluck="user",
     )
-    return {"ok": True, "team": team, "members": _pluck(members, "user")}
+    return {"ok": True, "team": team, "members": [u for u in members if u]}
+
+
+# Bilet listesi uç noktalarının döndürdüğü alanlar
+_TICKET_LIST_FIELDS = (
+    "name",
+    "subject",
+    "status",
+    "priority",
+    "agent_group",
+    "customer",
+    "opening_date",
+    "opening_time",
+    "modified",
+)
 
 
 @frappe.whitelist(allow_guest=True, methods=["GET"])
@@ -119,31 +258,22 @@ def get_tickets_by_team(
     status: str | None = None,
     limit: int = 50,
     start: int = 0,
+    cursor: str | None = None,
 ) -> Dict[str, Any]:
     """Takıma atanmış HD Ticket'lar."""
     filters: Dict[str, Any] = {"agent_group": team}
     if status:
         filters["status"] = status
 
-    tickets = frappe.get_all(
+    tickets, next_cursor = _paged_get_all(
         "HD Ticket",
-        fields=[
-            "name",
-            "subject",
-            "status",
-            "priority",
-            "agent_group",
-            "customer",
-            "opening_date",
-            "opening_time",
-            "modified",
-        ],
+        fields=list(_TICKET_LIST_FIELDS),
         filters=filters,
-        limit_start=start,
-        limit_page_length=limit,
-        order_by="modified desc",
+        limit=limit,
+        start=start,
+        cursor=cursor,
     )
-    return {"ok": True, "team": team, "tickets": tickets}
+    return {"ok": True, "team": team, "tickets": tickets, "next_cursor": next_cursor}
 
 
 @frappe.whitelist(allow_guest=True, methods=["GET"])
@@ -152,81 +282,90 @@ def get_tickets_by_user(
     status: str | None = None,
     limit: int = 50,
     start: int = 0,
+    cursor: str | None = None,
 ) -> Dict[str, Any]:
     """
     Kullanıcıya atanmış biletler.
     Frappe'de atamalar ToDo üstünden tutulur.
     """
-    assigned = frappe.get_all(
-        "ToDo",
-        fields=["reference_name"],
-        filters={
-            "reference_type": "HD Ticket",
-            "allocated_to": user,
-            "status": ["!=", "Closed"],
-        },
-        limit_page_length=1000,
+    # Tek sorgu: ToDo atamaları alt sorguda süzülür (IN semi-join; aynı bilete birden çok
+    # açık ToDo olsa da bilet tekrar etmez), sıralama/sayfalama DB'de yapılır
+    limit = cint(limit)
+    values: Dict[str, Any] = {"user": user, "start": cint(start), "limit": limit + 1}
+    status_clause = ""
+    if status:
+        status_clause = "AND t.status = %(status)s"
+        values["status"] = status
+    cursor_clause = ""
+    if cursor:
+        values["cm"], values["cn"] = _decode_cursor(cursor)
+        values["start"] = 0
+        cursor_clause = "AND (t.modified < %(cm)s OR (t.modified = %(cm)s AND t.name < %(cn)s))"
+    limit_clause = "LIMIT %(limit)s OFFSET %(start)s" if limit > 0 else ""
+
+    select = ", ".join(f"t.`{f}`" for f in _TICKET_LIST_FIELDS)
+    tickets = frappe.db.sql(
+        f"""
+        SELECT {select}
+        FROM `tabHD Ticket` t
+        WHERE t.name IN (
+            SELECT td.reference_name FROM `tabToDo` td
+            WHERE td.reference_type = 'HD Ticket'
+                AND td.allocated_to = %(user)s
+                AND td.status != 'Closed'
+        )
+        {status_clause}
+        {cursor_clause}
+        ORDER BY t.modified DESC, t.name DESC
+        {limit_clause}
+        """,
+        values,
+        as_dict=True,
     )
-    ticket_names = _pluck(assigned, "reference_name")
-    if not ticket_names:
-        return {"ok": True, "user": user, "tickets": []}
+    tickets, next_cursor = _split_page(tickets, limit)
+    return {"ok": True, "user": user, "tickets": tickets, "next_cursor": next_cursor}
 
-    filters: Dict[str, Any] = {"name": ["in", ticket_names]}
-    if status:
-        filters["status"] = status
 
-    tickets = frappe.get_all(
-        "HD Ticket",
-        fields=[
-            "name",
-            "subject",
-            "status",
-            "priority",
-            "agent_group",
-            "customer",
-            "opening_date",
-            "opening_time",
-            "modified",
-        ],
-        filters=filters,
-        limit_start=start,
-        limit_page_length=limit,
-        order_by="modified desc",
-    )
-    return {"ok": True, "user": user, "tickets": tickets}
+@site_cache(ttl=_META_TTL, maxsize=8)
+def _article_fields() -> tuple[tuple[str, ...], str | None]:
+    """HD Article için mevcut alanlar ve arama alanı (meta'ya bağlı, istek başına değişmez)."""
+    candidate_fields = [
+        "name", "title", "subject", "article_title", "content", "body", "description", "modified"
+    ]
+    meta = frappe.get_meta("HD Article")
+    fields = tuple(f for f in candidate_fields if meta.has_field(f) or f in ("name", "modified"))
+    like_field = "title" if meta.has_field("title") else ("subject" if meta.has_field("subject") else None)
+    return fields, like_field
 
 
 @frappe.whitelist(allow_guest=True, methods=["GET"])
-def get_articles(q: str | None = None, limit: int = 50, start: int = 0) -> Dict[str, Any]:
+def get_articles(
+    q: str | None = None, limit: int = 50, start: int = 0, cursor: str | None = None
+) -> Dict[str, Any]:
     """
     Bilgi bankası makaleleri (HD Article). Alan adları değişebileceği için
     asgari set döndürülür (name, title, content benzeri).
     """
-    candidate_fields = [
-        "name", "title", "subject", "article_title", "content", "body", "description", "modified"
-    ]
-    meta = frappe.get_meta("HD Article")
-    fields = [f for f in candidate_fields if meta.has_field(f) or f in ("name", "modified")]
+    fields, like_field = _article_fields()
 
     filters: Dict[str, Any] = {}
     if q:
-        like_field = "title" if meta.has_field("title") else ("subject" if meta.has_field("subject") else None)
         if like_field:
             filters[like_field] = ["like", f"%{q}%"]
 
-    res = frappe.get_all(
+    res, next_cursor = _paged_get_all(
         "HD Article",
-        fields=fields,
+        fields=list(fields),
         filters=filters,
-        limit_start=start,
-        limit_page_length=limit,
-        order_by="modified desc",
+        limit=limit,
+        start=start,
+        cursor=cursor,
     )
-    return {"ok": True, "articles": res}
+    return {"ok": True, "articles": res, "next_cursor": next_cursor}
 
 
 @frappe.whitelist(allow_guest=True, methods=["GET"])
-def get_ticket(ticket: str, fields: str | None = None) -> Dict[str, Any]:
+def get_ticket(ticket: str, fields: str | List[str] | None = None) -> Dict[str, Any]:
     """Tek bilet detayları (alan listesi opsiyonel). Shadow mode alanları kaldırıldı."""
     default_fields = [
         "name",
@@ -248,7 +387,8 @@ def get_ticket(ticket: str, fields: str | None = None) -> Dict[str, Any]:
     ]
     if fields:
         try:
-            req = json.loads(fields)
+            # Python çağrılarında liste doğrudan kullanılır; JSON metni yalnızca HTTP'den gelir
+            req = fields if isinstance(fields, list) else _loads(fields)
             if isinstance(req, list) and req:
                 default_fields = req
         except Exception:
@@ -312,22 +452,22 @@ _SELECT_SYNONYMS: Dict[str, Dict[str, str]] = {
     },
 }
 
+# Tek seviyeli (field, lowercase girdi) -> kanonik değer tablosu; kanonik değerlerin kendisi
+# de eklenir, böylece birebir eşleşme ve büyük/küçük harf düzeltmesi aynı aramaya iner
+_SELECT_LOOKUP: Dict[Tuple[str, str], str] = {
+    (f, c.lower()): c for f, canon in SELECT_FIELDS.items() for c in canon
+}
+_SELECT_LOOKUP.update(
+    {(f, k.lower()): v for f, syn in _SELECT_SYNONYMS.items() for k, v in syn.items()}
+)
+
+
 def _normalize_select(field: str, value: Any) -> str:
     """Case-insensitive, synonym-aware normalizer; returns canonical or original string."""
-    s = cstr(value).strip()
+    s = value.strip() if isinstance(value, str) else cstr(value).strip()
     if not s:
         return s
-    # exact match first (handles already-canonical values)
-    if s in SELECT_FIELDS.get(field, set()):
-        return s
-    lower = s.lower()
-    if field in _SELECT_SYNONYMS and lower in _SELECT_SYNONYMS[field]:
-        return _SELECT_SYNONYMS[field][lower]
-    # title-case fallback if matches canonical set
-    t = s.capitalize()
-    if t in SELECT_FIELDS.get(field, set()):
-        return t
-    return s
+    return _SELECT_LOOKUP.get((field, s.lower()), s)
 
 
 # Shadow mode alanı tamamen kaldırıldı
@@ -341,6 +481,9 @@ LINK_FIELDS: Dict[str, str] = {
 }
 
 ALLOWED_FIELDS = TEXT_FIELDS | FLOAT_FIELDS | set(SELECT_FIELDS) | set(LINK_FIELDS) | DATA_FIELDS
+# Tek UPDATE (set_value) ile yazılabilen alanlar; Link alanları atama/SLA/bildirim hook'larını
+# tetiklediği için her zaman doc.save() yolundan geçer
+FAST_UPDATE_FIELDS = TEXT_FIELDS | FLOAT_FIELDS | set(SELECT_FIELDS) | DATA_FIELDS
 
 
 # (A) TEXT birleştirme yardımcı fonksiyonu (test edilebilir, yan etkisiz)
@@ -353,60 +496,98 @@ def _append_text(base: str, new: str, do_append: bool) -> str:
     return new
 
 
+# --- Alan tipi -> değer dönüştürücü (alan başına tek dict araması) ------------
+
+def _conv_text(doc, k: str, v: Any, append: bool, clean_html: bool) -> str:
+    val = cstr(v)
+    if clean_html:
+        val = _clean_html(val)
+    return _append_text(cstr(getattr(doc, k) or ""), val, append)
+
+
+def _conv_float(doc, k: str, v: Any, append: bool, clean_html: bool) -> float:
+    return flt(v)
+
+
+def _conv_select(doc, k: str, v: Any, append: bool, clean_html: bool) -> str:
+    allowed = SELECT_FIELDS[k]
+    val = _normalize_select(k, v)
+    if val and val not in allowed:
+        frappe.throw(f"Invalid value for {k}. Allowed: {sorted(allowed)}")
+    return val
+
+
+def _conv_link(doc, k: str, v: Any, append: bool, clean_html: bool) -> Any:
+    # Değerler _validate_links_bulk ile önceden doğrulandı
+    return v or None
+
+
+def _conv_data(doc, k: str, v: Any, append: bool, clean_html: bool) -> str:
+    return cstr(v)
+
+
+# Sıra önemli: önce gelen tip (TEXT > FLOAT > SELECT > LINK > DATA) çakışmada kazanır
+_FIELD_HANDLERS: Dict[str, Callable[..., Any]] = {
+    **{k: _conv_data for k in DATA_FIELDS},
+    **{k: _conv_link for k in LINK_FIELDS},
+    **{k: _conv_select for k in SELECT_FIELDS},
+    **{k: _conv_float for k in FLOAT_FIELDS},
+    **{k: _conv_text for k in TEXT_FIELDS},
+}
+
+
 def _apply_ticket_updates(
     ticket: str,
     updates: Dict[str, Any],
     append: bool = False,
     clean_html: bool = True,
+    fast: bool = True,
 ) -> Dict[str, Any]:
+    """
+    Whitelist'teki HD Ticket alanlarını günceller.
+    fast=True: yalnızca FAST_UPDATE_FIELDS değiştiyse kontrolcü hook'ları çalışmaz; append için
+    gereken metin alanları tek sorguda okunur, değişiklikler tek UPDATE (frappe.db.set_value) ile
+    yazılır. Link alanı (agent_group, customer) değiştiyse doc.save() kullanılır.
+    fast=False: doc.save() ile tam doğrulama/versiyon/hook döngüsü.
+    """
     if not updates:
         return {"ok": False, "error": "No fields to update"}
 
-    doc = _get_doc("HD Ticket", ticket)
+    # Link alanlarını dokümanı yüklemeden, doctype başına tek sorguyla doğrula
+    link_map: Dict[str, List[Any]] = {}
+    for k, dt in LINK_FIELDS.items():
+        if updates.get(k):
+            link_map.setdefault(dt, []).append(updates[k])
+    _validate_links_bulk(link_map)
+
+    # Link alanı değişiyorsa baştan _get_doc + save: hook'lar çalışır, ikinci okuma olmaz
+    fast = fast and FAST_UPDATE_FIELDS.issuperset(k for k in updates if k in _FIELD_HANDLERS)
+    if fast:
+        # Mevcut metin yalnızca append'te gerekir; aksi halde sadece varlık kontrolü (name)
+        read = ["name", *(k for k in updates if k in TEXT_FIELDS)] if append else ["name"]
+        doc = frappe.db.get_value("HD Ticket", ticket, read, as_dict=True)
+        if not doc:
+            frappe.throw(f"HD Ticket {ticket} not found", frappe.DoesNotExistError)
+    else:
+        doc = _get_doc("HD Ticket", ticket)
     changed: Dict[str, Any] = {}
 
     for k, v in updates.items():
-        if k not in ALLOWED_FIELDS:
+        handler = _FIELD_HANDLERS.get(k)
+        if handler is None:
             continue
-        if k in TEXT_FIELDS:
-            val = cstr(v)
-            if clean_html:
-                val = _clean_html(val)
-            base = cstr(getattr(doc, k) or "")
-            val = _append_text(base, val, append)
-            setattr(doc, k, val)
-            changed[k] = val
-        elif k in FLOAT_FIELDS:
-            val = flt(v)
-            setattr(doc, k, val)
-            changed[k] = val
-        elif k in SELECT_FIELDS:
-            allowed = SELECT_FIELDS[k]
-            val = _normalize_select(k, v)
-            if val and val not in allowed:
-                frappe.throw(f"Invalid value for {k}. Allowed: {sorted(allowed)}")
-            setattr(doc, k, val)
-            changed[k] = val
-        elif k in LINK_FIELDS:
-            doctype = LINK_FIELDS[k]
-            if v:
-                if not frappe.db.exists(doctype, v):
-                    frappe.throw(f"Linked doc not found: {doctype} {v}")
-                setattr(doc, k, v)
-                changed[k] = v
-            else:
-                setattr(doc, k, None)
-                changed[k] = None
-        elif k in DATA_FIELDS:
-            val = cstr(v)
-            setattr(doc, k, val)
-            changed[k] = val
+        val = handler(doc, k, v, append, clean_html)
+        setattr(doc, k, val)
+        changed[k] = val
 
     if not changed:
         return {"ok": False, "error": "No allowed fields were provided"}
 
-    doc.save(ignore_permissions=True)
-    frappe.db.commit()
+    if fast:
+        frappe.db.set_value("HD Ticket", ticket, changed, update_modified=True)
+    else:
+        doc.save(ignore_permissions=True)
+    _commit_if_needed()
 
     return {"ok": True, "ticket": ticket, "changed": changed}
 
@@ -442,6 +623,15 @@ PROBLEM_LINK_FIELDS: Dict[str, str] = {
 PROBLEM_DATETIME_FIELDS = {"reported_on", "first_seen_on", "mitigated_on", "resolved_on"}
 PROBLEM_INT_FIELDS = {"reopened_count"}
 
+# Alan -> tip; upsert yalnızca gelen anahtarları bu tabloyla dolaşır
+_PROBLEM_FIELD_KINDS: Dict[str, str] = {
+    **{k: "int" for k in PROBLEM_INT_FIELDS},
+    **{k: "datetime" for k in PROBLEM_DATETIME_FIELDS},
+    **{k: "link" for k in PROBLEM_LINK_FIELDS},
+    **{k: "select" for k in PROBLEM_SELECT_FIELDS},
+    **{k: "text" for k in PROBLEM_TEXT_FIELDS},
+}
+
 
 def _find_problem_by_subject(subject: str) -> str | None:
     if not subject:
@@ -450,6 +640,8 @@ def _find_problem_by_subject(subject: str) -> str | None:
 
 
 def _changed(old, new) -> bool:
+    if old == new:  # Aynı tip/aynı değer (yaygın durum): cstr dönüşümüne gerek yok
+        return False
     o = (cstr(old) if old is not None else None)
     n = (cstr(new) if new is not None else None)
     return o != n
@@ -466,7 +658,8 @@ def get_problem_ticket(name: str, fields: str | None = None):
     ]
     if fields:
         try:
-            req = json.loads(fields)
+            # Python çağrılarında liste doğrudan kullanılır; JSON metni yalnızca HTTP'den gelir
+            req = fields if isinstance(fields, list) else _loads(fields)
             if isinstance(req, list) and req:
                 default_fields = req
         except Exception:
@@ -487,6 +680,7 @@ def list_problem_tickets(
     q: str | None = None,
     limit: int = 50,
     start: int = 0,
+    cursor: str | None = None,
 ):
     filters: Dict[str, Any] = {}
     if status:          filters["status"] = status
@@ -501,15 +695,15 @@ def list_problem_tickets(
         "first_seen_on", "mitigated_on", "resolved_on",
         "reopened_count", "modified",
     ]
-    rows = frappe.get_all(
+    rows, next_cursor = _paged_get_all(
         "Problem Ticket",
-        fields=fields,
+        fields=list(fields),
         filters=filters,
-        limit_start=start,
-        limit_page_length=limit,
-        order_by="modified desc",
+        limit=limit,
+        start=start,
+        cursor=cursor,
     )
-    return {"ok": True, "problems": rows}
+    return {"ok": True, "problems": rows, "next_cursor": next_cursor}
 
 
 @frappe.whitelist(allow_guest=True, methods=["POST", "PUT"])
@@ -537,77 +731,60 @@ def upsert_problem_ticket(
         if extras:
             frappe.throw(f"Unknown fields: {sorted(extras)}")
 
+    link_map: Dict[str, List[Any]] = {}
+    for k, dt in PROBLEM_LINK_FIELDS.items():
+        if data.get(k):
+            link_map.setdefault(dt, []).append(data[k])
+    _validate_links_bulk(link_map)
+
     created = False
 
     if not name and lookup_by == "subject" and data.get("subject"):
         name = _find_problem_by_subject(cstr(data["subject"]).strip())
 
     if name:
-        if not frappe.db.exists("Problem Ticket", name):
+        try:
+            doc = frappe.get_doc("Problem Ticket", name)
+        except frappe.DoesNotExistError:
             frappe.throw(f"Problem Ticket not found: {name}")
-        doc = frappe.get_doc("Problem Ticket", name)
     else:
         doc = frappe.new_doc("Problem Ticket")
         created = True
 
     changed: Dict[str, Any] = {}
+    normalize = cint(normalize_html)
 
-    for k in PROBLEM_TEXT_FIELDS:
-        if k in data:
-            val = cstr(data.get(k))
-            if k != "subject" and cint(normalize_html):
+    # Yalnızca gelen alanlar dolaşılır; her alan için mevcut değer tek kez okunur
+    for k, raw in data.items():
+        kind = _PROBLEM_FIELD_KINDS.get(k)
+        if kind is None:
+            continue
+        if kind == "text":
+            val = cstr(raw)
+            if k != "subject" and normalize:
                 val = _clean_html(val)
-            if created or _changed(getattr(doc, k, None), val):
-                setattr(doc, k, val)
-                changed[k] = val
-
-    for k, allowed in PROBLEM_SELECT_FIELDS.items():
-        if k in data:
-            v = cstr(data.get(k))
-            if v and v not in allowed:
+        elif kind == "select":
+            val = cstr(raw)
+            allowed = PROBLEM_SELECT_FIELDS[k]
+            if val and val not in allowed:
                 frappe.throw(f"Invalid value for {k}. Allowed: {sorted(allowed)}")
-            if created or _changed(getattr(doc, k, None), v):
-                setattr(doc, k, v)
-                changed[k] = v
-
-    for k, dt in PROBLEM_LINK_FIELDS.items():
-        if k in data:
-            v = data.get(k)
-            if v:
-                if not frappe.db.exists(dt, v):
-                    frappe.throw(f"Linked doc not found: {dt} {v}")
-                if created or _changed(getattr(doc, k, None), v):
-                    setattr(doc, k, v)
-                    changed[k] = v
-            else:
-                if created or _changed(getattr(doc, k, None), None):
-                    setattr(doc, k, None)
-                    changed[k] = None
-
-    for k in PROBLEM_DATETIME_FIELDS:
-        if k in data:
-            val = data.get(k)
-            if created or _changed(getattr(doc, k, None), val):
-                setattr(doc, k, val)
-                changed[k] = val
-
-    for k in PROBLEM_INT_FIELDS:
-        if k in data:
-            val = cint(data.get(k) or 0)
-            if created or _changed(getattr(doc, k, None), val):
-                setattr(doc, k, val)
-                changed[k] = val
+        elif kind == "link":
+            val = raw or None
+        elif kind == "datetime":
+            val = raw
+        else:
+            val = cint(raw or 0)
+        if created or _changed(doc.get(k), val):
+            setattr(doc, k, val)
+            changed[k] = val
 
     no_change = (not created) and (len(changed) == 0)
-    subject_for_log = cstr(data.get("subject") or getattr(doc, "subject", "")).strip()
 
     if created:
         doc.insert(ignore_permissions=True)
     elif changed:
         doc.save(ignore_permissions=True)
-    frappe.db.commit()
-
-    subject_for_log = cstr(getattr(doc, "subject", "") or data.get("subject") or "").strip()
+    _commit_if_needed()
 
     return {"ok": True, "name": doc.name, "created": created, "changed": changed, "no_change": no_change}
 
@@ -663,20 +840,25 @@ def set_metrics(
 _KB_DT = "Knowledge Base Update Request"
 
 
-def _kb_meta():
+def _meta(doctype: str):
     try:
-        return frappe.get_meta(_KB_DT)
+        return frappe.get_meta(doctype)
     except Exception:
-        frappe.throw(f"Meta not found for {_KB_DT}")
+        frappe.throw(f"Meta not found for {doctype}")
 
 
-def _kb_select_options(fieldname: str) -> set[str]:
-    meta = _kb_meta()
-    f = meta.get_field(fieldname)
+def _kb_meta():
+    return _meta(_KB_DT)
+
+
+@site_cache(ttl=_META_TTL, maxsize=64)
+def _select_options(doctype: str, fieldname: str) -> frozenset[str]:
+    """Select alanının seçenekleri; options metni alan başına bir kez ayrıştırılır."""
+    f = _meta(doctype).get_field(fieldname)
     if not f:
-        return set()
+        return frozenset()
     opts = cstr(getattr(f, "options", "")).strip()
-    return set([o.strip() for o in opts.split("\n") if o.strip()])
+    return frozenset(o.strip() for o in opts.split("\n") if o.strip())
 
 _KB_ALLOWED_FIELDS_BASE = {
     "subject", "priority", "target_doctype", "target_name", "target_path",
@@ -684,17 +866,53 @@ _KB_ALLOWED_FIELDS_BASE = {
 }
 
 
-def _kb_allowed_fields() -> set[str]:
+@site_cache(ttl=_META_TTL, maxsize=8)
+def _kb_allowed_fields() -> frozenset[str]:
     meta = _kb_meta()
-    return {f for f in _KB_ALLOWED_FIELDS_BASE if meta.has_field(f)}
+    return frozenset(f for f in _KB_ALLOWED_FIELDS_BASE if meta.has_field(f))
 
 
 def _kb_user() -> str:
-    try:
-        u = frappe.session.user or "Guest"
-    except Exception:
-        u = "Guest"
-    return u
+    return getattr(frappe.session, "user", None) or "Guest"
+
+
+# Ek çözümlemeleri Redis hash'inde tutulur (tüm worker'lar ortak); File değişince hash silinir
+_FILE_URL_CACHE_KEY = "brv_license_app:kb_file_url"
+
+
+def _lookup_file_url(s: str) -> str | None:
+    """File name ya da file_name -> file_url."""
+    # Önce name ile tek sorgu; bulunamazsa file_name ile (exists + get_value çifti yok)
+    row = frappe.db.get_value("File", s, ["name", "file_url"], as_dict=True)
+    if row:
+        return row.get("file_url") or s
+    row = frappe.db.get_value("File", {"file_name": s}, ["file_url"], as_dict=True)
+    if row and row.get("file_url"):
+        return row["file_url"]
+    return None
+
+
+def _resolve_file_url(s: str) -> str | None:
+    """_lookup_file_url sonucunu Redis'ten döner; bulunamayan ek de ("" olarak) önbelleklenir."""
+    cache = frappe.cache()
+    url = cache.hget(_FILE_URL_CACHE_KEY, s)
+    if url is None:
+        url = _lookup_file_url(s) or ""
+        cache.hset(_FILE_URL_CACHE_KEY, s, url)
+    return url or None
+
+
+def clear_file_cache(*args, **kwargs) -> None:
+    """File oluşturma/güncelleme/silmede ek çözümleme önbelleğini temizler (doc_events).
+    Redis'te olduğu için tüm worker'larda geçerlidir; hook commit'ten önce çalıştığından
+    arada yazılan eski sonuç commit sonrası bir kez daha silinir.
+    """
+    frappe.cache().delete_value(_FILE_URL_CACHE_KEY)
+    frappe.db.after_commit.add(_delete_file_url_cache)
+
+
+def _delete_file_url_cache():
+    frappe.cache().delete_value(_FILE_URL_CACHE_KEY)
 
 
 def _kb_resolve_attachment(val: str | None) -> str | None:
@@ -703,18 +921,15 @@ def _kb_resolve_attachment(val: str | None) -> str | None:
     s = cstr(val).strip()
     if not s:
         return None
+    if s.startswith(("/files/", "/private/files/", "http://", "https://")):
+        return s  # Zaten URL; DB'ye gitmeye gerek yok
     try:
-        if frappe.db.exists("File", s):
-            url = frappe.db.get_value("File", s, "file_url")
-            return url or s
-        row = frappe.db.get_value("File", {"file_name": s}, ["file_url"], as_dict=True)
-        if row and row.get("file_url"):
-            return row["file_url"]
+        return _resolve_file_url(s) or s
     except Exception:
-        pass
-    return s
+        return s
 
 
+@site_cache(ttl=_META_TTL, maxsize=8)
 def _kb_default_series() -> str:
     try:
         meta = _kb_meta()
@@ -725,65 +940,62 @@ def _kb_default_series() -> str:
         return "KBUR-.YYYY.-.#####"
 
 
+def clear_meta_cache(*args, **kwargs) -> None:
+    """Meta'dan türetilen önbellekleri temizler (clear_cache hook'u ve DocType/Custom Field doc_events)."""
+    for fn in (
+        _columns, _article_fields, _select_options, _kb_allowed_fields, _kb_default_series,
+    ):
+        fn.clear_cache()
+
+
 def _kb_validate_options(change_type: str | None, priority: str | None):
     if change_type:
-        allowed_ct = _kb_select_options("change_type")
+        allowed_ct = _select_options(_KB_DT, "change_type")
         if allowed_ct and change_type not in allowed_ct:
             frappe.throw(f"Invalid `change_type`. Allowed: {sorted(allowed_ct)}")
     if priority:
-        allowed_pr = _kb_select_options("priority")
+        allowed_pr = _select_options(_KB_DT, "priority")
         if allowed_pr and priority not in allowed_pr:
             frappe.throw(f"Invalid `priority`. Allowed: {sorted(allowed_pr)}")
 
 
-def _kb_collect_payload(fields: str | dict | None) -> Dict[str, Any]:
-    """İstemcinin gönderdiği gövdeden payload topla."""
+def _kb_collect_payload(fields: str | dict | None, allowed: frozenset[str]) -> Dict[str, Any]:
+    """İstemcinin gönderdiği gövdeden payload topla (ilk dolu kaynak kazanır, kopya yok)."""
     data = _parse_fields_arg(fields)
     if data:
         return data
 
-    req_json: Dict[str, Any] = {}
     try:
-        req_json = frappe.request.get_json() or {}
+        req_json = frappe.request.get_json(silent=True)
     except Exception:
-        try:
-            req_json = frappe.request.json or {}
-        except Exception:
-            req_json = {}
+        req_json = None
 
     if isinstance(req_json, dict):
         if isinstance(req_json.get("fields"), dict):
-            return req_json.get("fields")  # type: ignore
-        allowed = _kb_allowed_fields()
-        flat = {k: req_json.get(k) for k in allowed if k in req_json}
+            return req_json["fields"]
+        flat = {k: req_json[k] for k in allowed & req_json.keys()}
         if flat:
             return flat
 
-    try:
-        fd = dict(frappe.form_dict)
-        if "fields" in fd:
-            try:
-                return json.loads(fd.get("fields") or "{}")
-            except Exception:
-                return {}
-        else:
-            allowed = _kb_allowed_fields()
-            flat = {k: fd.get(k) for k in allowed if k in fd}
-            if flat:
-                return flat
-    except Exception:
-        pass
-
-    return {}
+    fd = frappe.form_dict or {}
+    if "fields" in fd:
+        raw = fd.get("fields")
+        if isinstance(raw, dict):
+            return raw
+        try:
+            return _loads(raw or "{}")
+        except Exception:
+            return {}
+    return {k: fd[k] for k in allowed & fd.keys()}
 
 
-def _kb_clean_payload(data: Dict[str, Any]) -> Dict[str, Any]:
-    allowed = _kb_allowed_fields()
+def _kb_clean_payload(data: Dict[str, Any], allowed: frozenset[str]) -> Dict[str, Any]:
     out: Dict[str, Any] = {}
-    for k in (data or {}):
-        if k not in allowed:
-            continue
-        v = data.get(k)
+    if not isinstance(data, dict):
+        data = {}
+    # Yalnızca izinli anahtarlar dolaşılır (fazla anahtar içeren gövdelerde tek küme kesişimi)
+    for k in allowed & data.keys():
+        v = data[k]
         if k in {"current_summary", "proposed_changes", "references"}:
             out[k] = _clean_html(cstr(v))
         elif k == "breaking_change":
@@ -800,8 +1012,9 @@ def _kb_create_request(
     fields: str | dict | None = None,
 ) -> Dict[str, Any]:
     # Sade akış – preview/strict parametreleri yok
-    payload_raw = _kb_collect_payload(fields)
-    payload = _kb_clean_payload(payload_raw)
+    allowed = _kb_allowed_fields()
+    payload_raw = _kb_collect_payload(fields, allowed)
+    payload = _kb_clean_payload(payload_raw, allowed)
 
     subject = cstr(payload.get("subject") or "").strip()
     if not subject:
@@ -830,9 +1043,10 @@ def _kb_create_request(
 
     doc = frappe.get_doc(created_doc)
     doc.insert(ignore_permissions=True)
-    frappe.db.commit()
+    name = doc.name
+    _commit_if_needed()
 
-    return {"ok": True, "name": doc.name, "change_type": change_type}
+    return {"ok": True, "name": name, "change_type": change_type}
 
 
 @frappe.whitelist(allow_guest=True, methods=["POST"])
@@ -876,7 +1090,7 @@ def log_ai_interaction(
             if not v:
                 return {}
             try:
-                return json.loads(v)
+                return _loads(v)
             except Exception:
                 return {"raw": v}
         return {"raw": cstr(v)}
@@ -910,22 +1124,3 @@ def update_ticket(
         append=cint(append) == 1,
         clean_html=cint(clean_html) == 1,
     )
-
-
-# --- Basit yerel testler (framework bağımsız) -------------------------------
-
-def _run_sanity_tests():
-    # TEXT birleştirme
-    assert _append_text("", "B", True) == "B"
-    assert _append_text("A", "B", True) == "A\nB"
-    assert _append_text("A", "B", False) == "B"
-    assert _append_text("A", "", True) == "A\n"
-
-    # options split davranışı
-    opts = "Open\nApproved\nRejected"
-    parsed = set([o.strip() for o in opts.split("\n") if o.strip()])
-    assert parsed == {"Open", "Approved", "Rejected"}
-
-
-if __name__ == "__main__":
-    _run_sanity_tests()
@@ -1,12 +1,50 @@
 from __future__ import annotations
+
 import frappe
 from frappe.utils import get_datetime, now_datetime
 
+# healthz'in okuduğu alanlar; Single doc'un tamamı yerine yalnızca bunlar çekilir
+_HEALTHZ_FIELDS = ("status", "grace_until", "reason", "last_validated")
+_HEALTHZ_CACHE_KEY = "brv_license_app:healthz_fields"
+_HEALTHZ_TTL = 30  # sn; silme kaçırılsa bile eski satır en fazla bu kadar yaşar
+_OK_STATUSES = frozenset({"ACTIVE", "VALIDATED"})
+
+
+def _read_license_fields() -> dict:
+    """License Settings'ten healthz alanlarını tek sorguyla okur (Document oluşturulmaz)."""
+    return frappe.db.get_value("License Settings", None, list(_HEALTHZ_FIELDS), as_dict=True) or {}
+
+
+def _cached_license_fields() -> dict:
+    """healthz alanlarını Redis'ten okur; yoksa DB'den okuyup TTL ile yazar."""
+    cache = frappe.cache()
+    row = cache.get_value(_HEALTHZ_CACHE_KEY)
+    if row is None:
+        row = _read_license_fields()
+        # get_value(generator=) süresiz yazar; TTL yalnızca set_value ile verilebilir
+        cache.set_value(_HEALTHZ_CACHE_KEY, row, expires_in_sec=_HEALTHZ_TTL)
+    return row
+
+
+def clear_healthz_cache(doc=None, method=None):
+    """License Settings kaydedildiğinde önbellekteki alanları sil (LicenseSettings.on_update).
+    on_update commit'ten önce çalışır: arada gelen bir healthz eski satırı yeniden yazabilir,
+    bu yüzden anahtar commit sonrası bir kez daha silinir.
+    """
+    frappe.cache().delete_value(_HEALTHZ_CACHE_KEY)
+    frappe.db.after_commit.add(_delete_healthz_key)
+
+
+def _delete_healthz_key():
+    frappe.cache().delete_value(_HEALTHZ_CACHE_KEY)
+
+
 @frappe.whitelist(allow_guest=True)
 def healthz():
     """Lisans sağlık kontrolü (License Settings'ten durum özetini döner)."""
     try:
-        doc = frappe.get_single("License Settings")
+        # Alanlar Redis'ten okunur; yoksa tek sorguyla doldurulur (kayıtta clear_healthz_cache siler)
+        row = _cached_license_fields() or {}
     except Exception as e:
         frappe.log_error(f"LicenseSettings fetch failed: {e}", "brv_license_app.api.license.healthz")
         return {
@@ -16,22 +54,20 @@ def healthz():
             "error": f"LicenseSettings fetch failed: {e}",
         }
 
-    status = (doc.status or "").upper()
-    grace_until = getattr(doc, "grace_until", None)
-    reason = getattr(doc, "reason", None)
-    last_validated = getattr(doc, "last_validated", None)
+    status = (row.get("status") or "").upper()
+    grace_until = row.get("grace_until")
+    reason = row.get("reason")
+    last_validated = row.get("last_validated")
 
-    # Grace süresi aktif mi?
-    grace_active = False
-    if grace_until:
+    # Lisans geçerli mi? Grace süresine yalnızca EXPIRED durumunda bakılır
+    ok = status in _OK_STATUSES
+    if not ok and status == "EXPIRED" and grace_until:
+        # Single değerleri tabSingles'tan metin olarak gelir; karşılaştırma için parse edilir
         try:
-            grace_active = get_datetime(grace_until) > now_datetime()
+            ok = get_datetime(grace_until) > now_datetime()
         except Exception:
             pass
 
-    # Lisans geçerli mi?
-    ok = status in {"ACTIVE", "VALIDATED"} or (status == "EXPIRED" and grace_active)
-
     return {
         "app": "brv_license_app",
         "site": frappe.local.site,
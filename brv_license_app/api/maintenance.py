@@ -1,6 +1,8 @@
 from __future__ import annotations
+import traceback
 from typing import Iterable, List, Dict, Any
 import frappe
+from frappe.utils import cint
 
 
 def _ensure_system_manager() -> None:
@@ -8,26 +10,135 @@ def _ensure_system_manager() -> None:
     user = frappe.session.user if getattr(frappe, "session", None) else None
     if user in {"Administrator"}:
         return
-    roles = set(frappe.get_roles(user)) if user else set()
-    if "System Manager" not in roles:
+    # Single indexed lookup on Has Role instead of loading the user's full role list
+    if not user or not frappe.db.exists(
+        "Has Role", {"parent": user, "parenttype": "User", "role": "System Manager"}
+    ):
         frappe.throw("Not permitted. System Manager required.", frappe.PermissionError)
 
 
-def _delete_all(doctype: str, filters: Dict[str, Any]) -> int:
+_BULK_SAVEPOINT = "maintenance_bulk_delete"
+_TICKET_SAVEPOINT = "maintenance_ticket_delete"
+_BATCH_SIZE = 500
+_MAX_LOGGED_ERRORS = 10
+
+
+def _error_entry(name: str) -> str:
+    """Describe the exception being handled: full traceback in developer mode, else its last line."""
+    if frappe.conf.get("developer_mode"):
+        return f"{name}:\n{traceback.format_exc()}"
+    return f"{name}: {traceback.format_exc(limit=0).strip()}"
+
+
+def _delete_all(doctype: str, filters: Dict[str, Any], bulk: bool = True) -> int:
     """Delete all documents of a doctype matching filters; ignore permissions and missing.
-    Returns number of deletions attempted.
+    bulk=True issues a single DELETE (no per-document hooks); if it fails, falls back to
+    frappe.delete_doc per row. Use bulk=False for doctypes whose on_trash must run (e.g. File).
+    Returns number of deletions attempted (affected rows for the bulk DELETE).
     """
+    if bulk:
+        frappe.db.savepoint(_BULK_SAVEPOINT)
+        try:
+            frappe.db.delete(doctype, filters)
+            # Row count of the DELETE itself; no separate COUNT round-trip
+            return frappe.db._cursor.rowcount
+        except Exception:
+            frappe.db.rollback(save_point=_BULK_SAVEPOINT)
+            frappe.log_error(title=f"Bulk delete {doctype} failed, retrying per document", message=traceback.format_exc())
+
     names = frappe.get_all(doctype, filters=filters, pluck="name")
+    failed: List[str] = []
     for name in names:
         try:
             frappe.delete_doc(doctype, name, ignore_permissions=True, ignore_missing=True, force=True)
         except Exception:
             # Swallow and continue; we'll still try to delete the ticket later
-            frappe.log_error(title=f"Force delete linked {doctype} failed", message=frappe.get_traceback())
+            failed.append(_error_entry(name))
+    if failed:
+        # One Error Log row for the whole batch instead of one insert per failure
+        frappe.log_error(
+            title=f"Force delete linked {doctype} failed ({len(failed)} of {len(names)})",
+            message="\n".join(failed[:_MAX_LOGGED_ERRORS]),
+        )
     return len(names)
 
 
-def force_delete_hd_tickets(names: Iterable[str]) -> Dict[str, Any]:
+# Linked docs commonly blocking deletion: (doctype, ticket field, extra filters, bulk delete)
+_LINKED_DOCTYPES = (
+    ("HD Ticket Comment", "reference_ticket", {}, True),
+    # delete_doc also removes Communication Link rows and the attached Files (email
+    # attachments) and runs Communication.on_trash; a raw DELETE would orphan them
+    ("Communication", "reference_name", {"reference_doctype": "HD Ticket"}, False),
+    # File.on_trash removes the stored file from disk, so keep per-document deletes
+    ("File", "attached_to_name", {"attached_to_doctype": "HD Ticket"}, False),
+    ("Activity Log", "reference_name", {"reference_doctype": "HD Ticket"}, True),
+    # Version keeps history; safe to remove for cleanup
+    ("Version", "docname", {"ref_doctype": "HD Ticket"}, True),
+)
+
+
+def _purge_batch(names: List[str], with_counts: bool = True) -> List[Dict[str, Any]]:
+    """Delete one batch of HD Tickets with their linked records; returns per-ticket results.
+    with_counts=False skips the per-ticket linked counts (linked_deleted is left empty).
+    """
+    keys = [str(n) for n in names]
+
+    # One query per linked doctype for all tickets: grouped count per ticket, then delete in bulk
+    # (bulk only for the log-type tables; see _LINKED_DOCTYPES)
+    linked: Dict[str, Dict[str, int]] = {}
+    try:
+        for doctype, field, extra, bulk in _LINKED_DOCTYPES:
+            filters = {**extra, field: ("in", keys)}
+            if not with_counts:
+                _delete_all(doctype, filters, bulk=bulk)
+                continue
+            linked[doctype] = dict(
+                frappe.get_all(
+                    doctype,
+                    filters=filters,
+                    fields=[field, "count(name) as count"],
+                    group_by=field,
+                    as_list=True,
+                )
+            )
+            if linked[doctype]:
+                _delete_all(doctype, filters, bulk=bulk)
+    except Exception:
+        error = traceback.format_exc()
+        return [{"ticket": t, "linked_deleted": {}, "status": "failed", "error": error} for t in names]
+
+    results: List[Dict[str, Any]] = []
+    # Per-ticket count lookups bound once per batch, not per ticket
+    count_getters = [(doctype, counts.get) for doctype, counts in linked.items()]
+    mute_emails = frappe.flags.mute_emails
+    frappe.flags.mute_emails = True
+    try:
+        for ticket, key in zip(names, keys):
+            res = {
+                "ticket": ticket,
+                "linked_deleted": {doctype: get(key, 0) for doctype, get in count_getters},
+                "status": "ok",
+            }
+            # Tickets always go through delete_doc: on_trash/after_delete, ToDo/assignment,
+            # Tag Link, dynamic link and Deleted Document cleanup only run there. A savepoint
+            # per ticket so one failing ticket does not block (or half-delete) the rest.
+            frappe.db.savepoint(_TICKET_SAVEPOINT)
+            try:
+                frappe.delete_doc("HD Ticket", ticket, ignore_permissions=True, ignore_missing=True, force=True)
+            except Exception:
+                frappe.db.rollback(save_point=_TICKET_SAVEPOINT)
+                res["status"] = "failed"
+                res["error"] = traceback.format_exc()
+            results.append(res)
+    finally:
+        frappe.flags.mute_emails = mute_emails
+
+    return results
+
+
+def force_delete_hd_tickets(
+    names: Iterable[str], batch_size: int = _BATCH_SIZE, stream: bool = False
+) -> Dict[str, Any]:
     """
     Force delete HD Tickets and common linked records (Communication, File, Comments, Activity).
 
@@ -36,38 +147,83 @@ def force_delete_hd_tickets(names: Iterable[str]) -> Dict[str, Any]:
 
     Args:
         names: Iterable of ticket names (e.g., ["1", "2"]).
+        batch_size: Tickets deleted per transaction; each batch is committed before the next.
+        stream: Publish progress per batch on the "hd_bulk_delete_progress" realtime event and
+            return only summary counts instead of per-ticket results (for large purges).
 
     Returns:
-        Dict with per-ticket results and counts of deleted linked records.
+        Dict with per-ticket results and counts of deleted linked records, or with
+        stream=True, {"deleted": int, "failed": [ticket names]}.
     """
     _ensure_system_manager()
 
-    if isinstance(names, (str, bytes)):
-        # Support comma-separated input
-        names = [n.strip() for n in str(names).split(",") if n.strip()]
-
-    out: Dict[str, Any] = {"results": []}
-
-    for ticket in names:  # type: ignore[assignment]
-        res = {"ticket": ticket, "linked_deleted": {}, "status": "ok"}
-        try:
-            # Linked docs commonly blocking deletion
-            res["linked_deleted"]["HD Ticket Comment"] = _delete_all("HD Ticket Comment", {"reference_ticket": ticket})
-            res["linked_deleted"]["Communication"] = _delete_all("Communication", {"reference_doctype": "HD Ticket", "reference_name": ticket})
-            res["linked_deleted"]["File"] = _delete_all("File", {"attached_to_doctype": "HD Ticket", "attached_to_name": ticket})
-            res["linked_deleted"]["Activity Log"] = _delete_all("Activity Log", {"reference_doctype": "HD Ticket", "reference_name": ticket})
-            # Version keeps history; safe to remove for cleanup
-            res["linked_deleted"]["Version"] = _delete_all("Version", {"ref_doctype": "HD Ticket", "docname": ticket})
-
-            # Finally delete the ticket itself
+    if isinstance(names, bytes):
+        # frappe.parse_json only parses str; bytes would fall through to the CSV split
+        names = names.decode()
+    if isinstance(names, str):
+        # JSON array first (API callers); anything else is treated as comma-separated input
+        parsed = None
+        if names.lstrip()[:1] == "[":
             try:
-                frappe.delete_doc("HD Ticket", ticket, ignore_permissions=True, ignore_missing=True, force=True)
+                parsed = frappe.parse_json(names)
             except Exception:
-                res["status"] = "failed"
-                res["error"] = frappe.get_traceback()
-        except Exception:
-            res["status"] = "failed"
-            res["error"] = frappe.get_traceback()
-        out["results"].append(res)
+                pass
+        if isinstance(parsed, list):
+            names = parsed
+        else:
+            names = [n.strip() for n in names.split(",") if n.strip()]
+
+    names = list(names)  # type: ignore[assignment]
+    stream = cint(stream)
+    out: Dict[str, Any] = {"deleted": 0, "failed": []} if stream else {"results": []}
+    if not names:
+        return out
+    batch_size = max(cint(batch_size) or _BATCH_SIZE, 1)
+    total = len(names)
+
+    # Commit per batch: bounded transaction/lock size, and finished batches survive a later failure
+    for i in range(0, total, batch_size):
+        # Streaming drops per-ticket results, so the linked count queries are not needed
+        results = _purge_batch(names[i : i + batch_size], with_counts=not stream)
+        frappe.db.commit()
+        if not stream:
+            out["results"].extend(results)
+            continue
+        # Per-ticket results are dropped after each batch; only the summary is kept in memory
+        for res in results:
+            if res["status"] == "ok":
+                out["deleted"] += 1
+            else:
+                out["failed"].append(res["ticket"])
+        frappe.publish_realtime(
+            "hd_bulk_delete_progress",
+            {"done": min(i + batch_size, total), "total": total, "failed": len(out["failed"])},
+            user=frappe.session.user,
+        )
 
     return out
+
+
+def force_delete_all_hd_tickets() -> Dict[str, Any]:
+    """
+    Delete every HD Ticket and all of its linked records (Communication, File, Comments, Activity).
+
+    Unlike force_delete_hd_tickets, no ticket names are sent to the database: linked rows are
+    removed by reference doctype only and the HD Ticket table is truncated. TRUNCATE commits
+    implicitly and cannot be rolled back, so this is irreversible. Only System Manager can run it.
+
+    Returns:
+        Dict with the number of deleted tickets and deleted linked records per doctype.
+    """
+    _ensure_system_manager()
+
+    linked_deleted: Dict[str, int] = {}
+    for doctype, _field, extra, bulk in _LINKED_DOCTYPES:
+        linked_deleted[doctype] = _delete_all(doctype, dict(extra), bulk=bulk)
+    for df in frappe.get_meta("HD Ticket").get_table_fields():
+        frappe.db.delete(df.options, {"parenttype": "HD Ticket"})
+
+    deleted = frappe.db.count("HD Ticket")
+    frappe.db.commit()
+    frappe.db.truncate("HD Ticket")
+    return {"deleted": deleted, "linked_deleted": linked_deleted}
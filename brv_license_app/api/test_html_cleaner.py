@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Test suite for html_cleaner.py helpers.
+Follows Frappe testing conventions: https://docs.frappe.io/framework/user/en/testing
+"""
+from __future__ import annotations
+
+import unittest
+
+import math
+
+from brv_license_app.api.html_cleaner import _clean, _loads, _may_have_tags, _strip_tags
+
+
+class TestStripTags(unittest.TestCase):
+    """Test the single-pass tag scanner."""
+
+    def test_plain_text_untouched(self):
+        """Strings without tags are returned as-is."""
+        self.assertEqual(_strip_tags(""), "")
+        self.assertEqual(_strip_tags("Plain text"), "Plain text")
+
+    def test_simple_tags(self):
+        """Opening/closing tags with attributes are removed."""
+        self.assertEqual(_strip_tags("<p>Hello</p>"), "Hello")
+        self.assertEqual(_strip_tags('<a href="x" class="y">link</a> text'), "link text")
+        self.assertEqual(_strip_tags("line<br/>break"), "linebreak")
+        self.assertEqual(_strip_tags("<div\nclass='x'>multi</div>"), "multi")
+
+    def test_non_tag_brackets_preserved(self):
+        """Empty or unbalanced brackets behave like the previous regex."""
+        self.assertEqual(_strip_tags("<>"), "<>")
+        self.assertEqual(_strip_tags("a < b"), "a < b")
+        self.assertEqual(_strip_tags("a > b"), "a > b")
+        self.assertEqual(_strip_tags("<<b>x"), "<x")
+        self.assertEqual(_strip_tags("</>"), "")
+
+    def test_pathological_inputs(self):
+        """Tag-heavy / unbalanced inputs are handled in a single linear pass."""
+        n = 200_000
+        self.assertEqual(_strip_tags("<" * n), "<" * n)
+        self.assertEqual(_strip_tags("<a" * n), "<a" * n)
+        self.assertEqual(_strip_tags("<" * n + "a>"), "<" * (n - 1))
+        self.assertEqual(_strip_tags("<b>" * n + "x"), "x")
+        attrs = " ".join(f'data-k{i}="v{i}"' for i in range(20_000))
+        self.assertEqual(_strip_tags(f"<div {attrs}>body</div>"), "body")
+
+
+class TestClean(unittest.TestCase):
+    """Test JSON traversal."""
+
+    def test_nested_structure(self):
+        """Only string values are cleaned; structure and other types are kept."""
+        data = {"a": "<b>x</b>", "b": [1, "<i>y</i>", None, {"c": "<p>z</p>"}], "d": True}
+        self.assertEqual(
+            _clean(data),
+            {"a": "x", "b": [1, "y", None, {"c": "z"}], "d": True},
+        )
+
+    def test_scalars(self):
+        """Top-level scalars are handled without a container."""
+        self.assertEqual(_clean("<b>x</b>"), "x")
+        self.assertEqual(_clean(42), 42)
+        self.assertIsNone(_clean(None))
+
+    def test_deep_nesting(self):
+        """Deeply nested payloads do not hit the recursion limit."""
+        data = leaf = []
+        for _ in range(5000):
+            child = []
+            leaf.append(child)
+            leaf = child
+        leaf.append("<p>deep</p>")
+        _clean(data)
+        self.assertEqual(leaf, ["deep"])
+
+    def test_cycle_is_safe(self):
+        """Self-referencing containers are visited once."""
+        data = {"a": "<i>x</i>"}
+        data["self"] = data
+        self.assertIs(_clean(data), data)
+        self.assertEqual(data["a"], "x")
+
+
+class TestMayHaveTags(unittest.TestCase):
+    """Test the raw-body precheck."""
+
+    def test_detects_literal_and_escaped_brackets(self):
+        """Both '<' and its JSON \\u003c escape count as possible tags."""
+        self.assertTrue(_may_have_tags(b'{"a": "<b>x</b>"}'))
+        self.assertTrue(_may_have_tags(b'{"a": "\\u003cb>x"}'))
+        self.assertTrue(_may_have_tags('{"a": "\\u003Cb>x"}'))
+        self.assertFalse(_may_have_tags(b'{"a": "plain", "b": [1, 2]}'))
+
+
+class TestLoads(unittest.TestCase):
+    """Test body parsing."""
+
+    def test_orjson_rejects_fall_back_to_parse_json(self):
+        """NaN, Infinity and integers beyond 64 bits parse instead of raising."""
+        big = 2**70
+        for raw in (f'{{"n": {big}}}', f'{{"n": {big}}}'.encode()):
+            self.assertEqual(_loads(raw), {"n": big})
+        data = _loads(b'{"a": NaN, "b": Infinity}')
+        self.assertTrue(math.isnan(data["a"]))
+        self.assertEqual(data["b"], math.inf)
+
+    def test_invalid_utf8_bytes_ignored(self):
+        """Invalid UTF-8 bytes are dropped, as before."""
+        self.assertEqual(_loads(b'{"a": "x\xffy"}'), {"a": "xy"})
+
+
+# Run tests if executed directly
+if __name__ == "__main__":
+    unittest.main()
@@ -6,18 +6,25 @@ Follows Frappe testing conventions: https://docs.frappe.io/framework/user/en/tes
 from __future__ import annotations
 
 import unittest
+import itertools
 import json
+from functools import lru_cache
 from typing import Dict, Any
+from unittest.mock import patch
 
 import frappe
 from frappe.utils import cint, flt
 
 # Import functions to test
+from brv_license_app.api import ai_log
 from brv_license_app.api.ingest import (
     _clean_html,
     _parse_fields_arg,
     _pluck,
     _append_text,
+    _encode_cursor,
+    _decode_cursor,
+    _split_page,
     _normalize_select,
     get_teams,
     get_team_members,
@@ -42,10 +49,21 @@ from brv_license_app.api.ingest import (
 )
 
 
+# Fixture helpers do not commit; callers commit once after creating everything they need.
+# Existing rows come back as frappe._dict(name=...): tests only use .name, so no get_doc load.
+
+_TEAM = None  # Shared by every test class; resolved on first use
+_TICKET_SEQ = itertools.count(1)  # Unique ticket subjects within a test run
+
+
 def create_test_team():
-    """Create a test HD Team for testing."""
+    """Create a test HD Team for testing (once per test process)."""
+    global _TEAM
+    if _TEAM is not None:
+        return _TEAM
     if frappe.db.exists("HD Team", "_Test Team"):
-        return frappe.get_doc("HD Team", "_Test Team")
+        _TEAM = frappe._dict(name="_Test Team")
+        return _TEAM
     
     team = frappe.get_doc({
         "doctype": "HD Team",
@@ -54,7 +72,7 @@ def create_test_team():
         "description": "Test team for unit tests"
     })
     team.insert(ignore_permissions=True)
-    frappe.db.commit()
+    _TEAM = team
     return team
 
 
@@ -66,7 +84,7 @@ def create_test_ticket(subject="_Test Ticket", team=None):
     # Check if ticket already exists
     existing = frappe.db.get_value("HD Ticket", {"subject": subject}, "name")
     if existing:
-        return frappe.get_doc("HD Ticket", existing)
+        return frappe._dict(name=existing)
     
     ticket = frappe.get_doc({
         "doctype": "HD Ticket",
@@ -77,7 +95,6 @@ def create_test_ticket(subject="_Test Ticket", team=None):
         "description": "Test ticket description"
     })
     ticket.insert(ignore_permissions=True)
-    frappe.db.commit()
     return ticket
 
 
@@ -86,7 +103,7 @@ def create_test_article(title="_Test Article"):
     # Check if article already exists
     existing = frappe.db.get_value("HD Article", {"title": title}, "name")
     if existing:
-        return frappe.get_doc("HD Article", existing)
+        return frappe._dict(name=existing)
     
     article = frappe.get_doc({
         "doctype": "HD Article",
@@ -94,20 +111,118 @@ def create_test_article(title="_Test Article"):
         "content": "Test article content"
     })
     article.insert(ignore_permissions=True)
-    frappe.db.commit()
     return article
 
 
+@lru_cache(maxsize=None)
+def _hd_ticket_has(fieldname: str) -> bool:
+    """HD Ticket field presence, resolved once per test process for all classes."""
+    return bool(frappe.get_meta("HD Ticket").has_field(fieldname))
+
+
+@lru_cache(maxsize=None)
+def _table_exists(doctype: str) -> bool:
+    """Doctype table presence, resolved once per test process."""
+    return bool(frappe.db.table_exists(doctype))
+
+
+def _ensure_admin() -> None:
+    """Re-set the session user only if a test switched it (set_user resets permission caches)."""
+    if getattr(frappe.session, "user", None) != "Administrator":
+        frappe.set_user("Administrator")
+
+
+def _read(doctype: str, name: str, *fields: str):
+    """Read only the asserted columns (single SELECT, no Document load)."""
+    return frappe.db.get_value(doctype, name, list(fields), as_dict=True)
+
+
+# (field, input, expected) — English inputs normalize to Turkish
+_NORMALIZE_SELECT_EN = [
+    ("last_sentiment", "Positive", "Olumlu"),
+    ("last_sentiment", "pos", "Olumlu"),
+    ("last_sentiment", "positive", "Olumlu"),
+    ("last_sentiment", "+", "Olumlu"),
+    ("last_sentiment", "Neutral", "Nötr"),
+    ("last_sentiment", "neu", "Nötr"),
+    ("last_sentiment", "neutral", "Nötr"),
+    ("last_sentiment", "0", "Nötr"),
+    ("last_sentiment", "Nautral", "Nötr"),  # Legacy typo
+    ("last_sentiment", "Negative", "Olumsuz"),
+    ("last_sentiment", "neg", "Olumsuz"),
+    ("last_sentiment", "-", "Olumsuz"),
+    ("effort_band", "Low", "Düşük"),
+    ("effort_band", "l", "Düşük"),
+    ("effort_band", "low", "Düşük"),
+    ("effort_band", "Medium", "Orta"),
+    ("effort_band", "m", "Orta"),
+    ("effort_band", "med", "Orta"),
+    ("effort_band", "High", "Yüksek"),
+    ("effort_band", "h", "Yüksek"),
+    ("effort_band", "hi", "Yüksek"),
+]
+
+# (field, input, expected) — Turkish inputs stay as canonical Turkish
+_NORMALIZE_SELECT_TR = [
+    ("last_sentiment", "pozitif", "Olumlu"),
+    ("last_sentiment", "olumlu", "Olumlu"),
+    ("last_sentiment", "Pozitif", "Olumlu"),
+    ("last_sentiment", "Olumlu", "Olumlu"),  # Already canonical
+    ("last_sentiment", "nötr", "Nötr"),
+    ("last_sentiment", "notr", "Nötr"),
+    ("last_sentiment", "tarafsız", "Nötr"),
+    ("last_sentiment", "tarafsiz", "Nötr"),
+    ("last_sentiment", "Nötr", "Nötr"),  # Already canonical
+    ("last_sentiment", "negatif", "Olumsuz"),
+    ("last_sentiment", "olumsuz", "Olumsuz"),
+    ("last_sentiment", "Olumsuz", "Olumsuz"),  # Already canonical
+    ("effort_band", "düşük", "Düşük"),
+    ("effort_band", "dusuk", "Düşük"),
+    ("effort_band", "az", "Düşük"),
+    ("effort_band", "Düşük", "Düşük"),  # Already canonical
+    ("effort_band", "orta", "Orta"),
+    ("effort_band", "Orta", "Orta"),  # Already canonical
+    ("effort_band", "yüksek", "Yüksek"),
+    ("effort_band", "yuksek", "Yüksek"),
+    ("effort_band", "çok", "Yüksek"),
+    ("effort_band", "cok", "Yüksek"),
+    ("effort_band", "Yüksek", "Yüksek"),  # Already canonical
+]
+
+# (last_sentiment input, stored value)
+_SENTIMENT_SYNONYM_CASES = [
+    ("pos", "Olumlu"),
+    ("neu", "Nötr"),
+    ("neg", "Olumsuz"),
+]
+
+# (input, expected)
+_CLEAN_HTML_CASES = [
+    ("<p>Hello</p>", "Hello"),
+    ("<b>Bold</b> text", "Bold text"),
+    (None, ""),
+    ("", ""),
+    ("Plain text", "Plain text"),
+]
+
+# (existing, incoming, append, expected)
+_APPEND_TEXT_CASES = [
+    ("", "B", True, "B"),
+    ("A", "B", True, "A\nB"),
+    ("A", "B", False, "B"),
+    ("A", "", True, "A\n"),
+    ("", "", False, ""),
+]
+
+
 class TestIngestHelperFunctions(unittest.TestCase):
     """Test helper/utility functions."""
     
     def test_clean_html(self):
         """Test HTML cleaning function."""
-        self.assertEqual(_clean_html("<p>Hello</p>"), "Hello")
-        self.assertEqual(_clean_html("<b>Bold</b> text"), "Bold text")
-        self.assertEqual(_clean_html(None), "")
-        self.assertEqual(_clean_html(""), "")
-        self.assertEqual(_clean_html("Plain text"), "Plain text")
+        for value, expected in _CLEAN_HTML_CASES:
+            with self.subTest(value=value):
+                self.assertEqual(_clean_html(value), expected)
     
     def test_parse_fields_arg(self):
         """Test field argument parsing."""
@@ -139,77 +254,38 @@ class TestIngestHelperFunctions(unittest.TestCase):
         self.assertEqual(_pluck([], "name"), [])
         self.assertEqual(_pluck(None, "name"), [])
     
+    def test_cursor_roundtrip(self):
+        """Test cursor encoding and page splitting."""
+        row = {"name": "HD-0001", "modified": "2025-01-02 03:04:05.123456"}
+        cursor = _encode_cursor(row)
+        self.assertNotIn("=", cursor)
+        self.assertEqual(_decode_cursor(cursor), ("2025-01-02 03:04:05.123456", "HD-0001"))
+        with self.assertRaises(frappe.ValidationError):
+            _decode_cursor("not-a-cursor")
+        
+        rows = [{"name": str(i), "modified": str(i)} for i in range(3)]
+        page, next_cursor = _split_page(rows, 2)
+        self.assertEqual(page, rows[:2])
+        self.assertEqual(_decode_cursor(next_cursor), ("1", "1"))
+        self.assertEqual(_split_page(rows, 3), (rows, None))
+    
     def test_append_text(self):
         """Test text appending logic."""
-        self.assertEqual(_append_text("", "B", True), "B")
-        self.assertEqual(_append_text("A", "B", True), "A\nB")
-        self.assertEqual(_append_text("A", "B", False), "B")
-        self.assertEqual(_append_text("A", "", True), "A\n")
-        self.assertEqual(_append_text("", "", False), "")
+        for existing, incoming, append, expected in _APPEND_TEXT_CASES:
+            with self.subTest(existing=existing, incoming=incoming, append=append):
+                self.assertEqual(_append_text(existing, incoming, append), expected)
     
     def test_normalize_select_english(self):
         """Test SELECT field normalization - English inputs normalize to Turkish."""
-        # last_sentiment: English → Turkish
-        self.assertEqual(_normalize_select("last_sentiment", "Positive"), "Olumlu")
-        self.assertEqual(_normalize_select("last_sentiment", "pos"), "Olumlu")
-        self.assertEqual(_normalize_select("last_sentiment", "positive"), "Olumlu")
-        self.assertEqual(_normalize_select("last_sentiment", "+"), "Olumlu")
-        
-        self.assertEqual(_normalize_select("last_sentiment", "Neutral"), "Nötr")
-        self.assertEqual(_normalize_select("last_sentiment", "neu"), "Nötr")
-        self.assertEqual(_normalize_select("last_sentiment", "neutral"), "Nötr")
-        self.assertEqual(_normalize_select("last_sentiment", "0"), "Nötr")
-        self.assertEqual(_normalize_select("last_sentiment", "Nautral"), "Nötr")  # Legacy typo
-        
-        self.assertEqual(_normalize_select("last_sentiment", "Negative"), "Olumsuz")
-        self.assertEqual(_normalize_select("last_sentiment", "neg"), "Olumsuz")
-        self.assertEqual(_normalize_select("last_sentiment", "-"), "Olumsuz")
-        
-        # effort_band: English → Turkish
-        self.assertEqual(_normalize_select("effort_band", "Low"), "Düşük")
-        self.assertEqual(_normalize_select("effort_band", "l"), "Düşük")
-        self.assertEqual(_normalize_select("effort_band", "low"), "Düşük")
-        
-        self.assertEqual(_normalize_select("effort_band", "Medium"), "Orta")
-        self.assertEqual(_normalize_select("effort_band", "m"), "Orta")
-        self.assertEqual(_normalize_select("effort_band", "med"), "Orta")
-        
-        self.assertEqual(_normalize_select("effort_band", "High"), "Yüksek")
-        self.assertEqual(_normalize_select("effort_band", "h"), "Yüksek")
-        self.assertEqual(_normalize_select("effort_band", "hi"), "Yüksek")
+        for field, value, expected in _NORMALIZE_SELECT_EN:
+            with self.subTest(f"{field}:{value}"):
+                self.assertEqual(_normalize_select(field, value), expected)
     
     def test_normalize_select_turkish(self):
         """Test SELECT field normalization - Turkish inputs remain Turkish."""
-        # last_sentiment - Turkish inputs stay as canonical Turkish
-        self.assertEqual(_normalize_select("last_sentiment", "pozitif"), "Olumlu")
-        self.assertEqual(_normalize_select("last_sentiment", "olumlu"), "Olumlu")
-        self.assertEqual(_normalize_select("last_sentiment", "Pozitif"), "Olumlu")
-        self.assertEqual(_normalize_select("last_sentiment", "Olumlu"), "Olumlu")  # Already canonical
-        
-        self.assertEqual(_normalize_select("last_sentiment", "nötr"), "Nötr")
-        self.assertEqual(_normalize_select("last_sentiment", "notr"), "Nötr")
-        self.assertEqual(_normalize_select("last_sentiment", "tarafsız"), "Nötr")
-        self.assertEqual(_normalize_select("last_sentiment", "tarafsiz"), "Nötr")
-        self.assertEqual(_normalize_select("last_sentiment", "Nötr"), "Nötr")  # Already canonical
-        
-        self.assertEqual(_normalize_select("last_sentiment", "negatif"), "Olumsuz")
-        self.assertEqual(_normalize_select("last_sentiment", "olumsuz"), "Olumsuz")
-        self.assertEqual(_normalize_select("last_sentiment", "Olumsuz"), "Olumsuz")  # Already canonical
-        
-        # effort_band - Turkish inputs stay as canonical Turkish
-        self.assertEqual(_normalize_select("effort_band", "düşük"), "Düşük")
-        self.assertEqual(_normalize_select("effort_band", "dusuk"), "Düşük")
-        self.assertEqual(_normalize_select("effort_band", "az"), "Düşük")
-        self.assertEqual(_normalize_select("effort_band", "Düşük"), "Düşük")  # Already canonical
-        
-        self.assertEqual(_normalize_select("effort_band", "orta"), "Orta")
-        self.assertEqual(_normalize_select("effort_band", "Orta"), "Orta")  # Already canonical
-        
-        self.assertEqual(_normalize_select("effort_band", "yüksek"), "Yüksek")
-        self.assertEqual(_normalize_select("effort_band", "yuksek"), "Yüksek")
-        self.assertEqual(_normalize_select("effort_band", "çok"), "Yüksek")
-        self.assertEqual(_normalize_select("effort_band", "cok"), "Yüksek")
-        self.assertEqual(_normalize_select("effort_band", "Yüksek"), "Yüksek")  # Already canonical
+        for field, value, expected in _NORMALIZE_SELECT_TR:
+            with self.subTest(f"{field}:{value}"):
+                self.assertEqual(_normalize_select(field, value), expected)
 
 
 class TestIngestGetEndpoints(unittest.TestCase):
@@ -222,10 +298,11 @@ class TestIngestGetEndpoints(unittest.TestCase):
         cls.team = create_test_team()
         cls.ticket = create_test_ticket()
         cls.article = create_test_article()
+        frappe.db.commit()
     
     def setUp(self):
         """Setup before each test."""
-        frappe.set_user("Administrator")
+        _ensure_admin()
     
     def test_get_teams(self):
         """Test get_teams endpoint."""
@@ -279,7 +356,7 @@ class TestIngestGetEndpoints(unittest.TestCase):
     def test_get_ticket(self):
         """Test get_ticket endpoint."""
         # Use only core fields that definitely exist
-        core_fields = '["name", "subject", "status"]'
+        core_fields = ["name", "subject", "status"]
         result = get_ticket(self.ticket.name, fields=core_fields)
         self.assertTrue(result.get("ok"))
         self.assertIn("ticket", result)
@@ -311,29 +388,31 @@ class TestIngestTicketUpdateEndpoints(unittest.TestCase):
         cls.team = create_test_team()
         
         # Check which custom fields exist on HD Ticket
-        meta = frappe.get_meta("HD Ticket")
-        cls.has_ai_summary = meta.has_field("ai_summary")
-        cls.has_ai_reply_suggestion = meta.has_field("ai_reply_suggestion")
-        cls.has_last_sentiment = meta.has_field("last_sentiment")
-        cls.has_sentiment_trend = meta.has_field("sentiment_trend")
-        cls.has_effort_score = meta.has_field("effort_score")
-        cls.has_effort_band = meta.has_field("effort_band")
-        cls.has_cluster_hash = meta.has_field("cluster_hash")
+        cls.has_ai_summary = _hd_ticket_has("ai_summary")
+        cls.has_ai_reply_suggestion = _hd_ticket_has("ai_reply_suggestion")
+        cls.has_last_sentiment = _hd_ticket_has("last_sentiment")
+        cls.has_sentiment_trend = _hd_ticket_has("sentiment_trend")
+        cls.has_effort_score = _hd_ticket_has("effort_score")
+        cls.has_effort_band = _hd_ticket_has("effort_band")
+        cls.has_cluster_hash = _hd_ticket_has("cluster_hash")
+        
+        # One ticket for the whole class: every test writes the fields it asserts on
+        cls.ticket = create_test_ticket(subject=f"_Test Ticket {next(_TICKET_SEQ)}")
+        frappe.db.commit()
     
-    def setUp(self):
-        """Setup before each test - create fresh ticket."""
-        frappe.set_user("Administrator")
-        self.ticket = create_test_ticket(subject=f"_Test Ticket {frappe.utils.now()}")
+    @classmethod
+    def tearDownClass(cls):
+        """Cleanup once after all tests."""
+        _ensure_admin()
+        try:
+            frappe.delete_doc("HD Ticket", cls.ticket.name, force=1)
+            frappe.db.commit()
+        except Exception:
+            pass
     
-    def tearDown(self):
-        """Cleanup after each test."""
-        frappe.set_user("Administrator")
-        if hasattr(self, "ticket") and self.ticket:
-            try:
-                frappe.delete_doc("HD Ticket", self.ticket.name, force=1)
-                frappe.db.commit()
-            except Exception:
-                pass
+    def setUp(self):
+        """Setup before each test."""
+        _ensure_admin()
     
     def test_ingest_summary(self):
         """Test ingest_summary endpoint."""
@@ -352,8 +431,8 @@ class TestIngestTicketUpdateEndpoints(unittest.TestCase):
         self.assertIn("ai_summary", result["changed"])
         
         # Verify change
-        doc = frappe.get_doc("HD Ticket", self.ticket.name)
-        self.assertEqual(doc.ai_summary, "AI generated summary")
+        row = _read("HD Ticket", self.ticket.name, "ai_summary")
+        self.assertEqual(row.ai_summary, "AI generated summary")
     
     def test_ingest_summary_append(self):
         """Test ingest_summary with append mode."""
@@ -378,9 +457,9 @@ class TestIngestTicketUpdateEndpoints(unittest.TestCase):
         self.assertTrue(result.get("ok"))
         
         # Verify appended
-        doc = frappe.get_doc("HD Ticket", self.ticket.name)
-        self.assertIn("First summary", doc.ai_summary)
-        self.assertIn("Second summary", doc.ai_summary)
+        row = _read("HD Ticket", self.ticket.name, "ai_summary")
+        self.assertIn("First summary", row.ai_summary)
+        self.assertIn("Second summary", row.ai_summary)
     
     def test_set_reply_suggestion(self):
         """Test set_reply_suggestion endpoint."""
@@ -397,8 +476,8 @@ class TestIngestTicketUpdateEndpoints(unittest.TestCase):
         self.assertIn("ai_reply_suggestion", result["changed"])
         
         # Verify
-        doc = frappe.get_doc("HD Ticket", self.ticket.name)
-        self.assertEqual(doc.ai_reply_suggestion, "Suggested reply text")
+        row = _read("HD Ticket", self.ticket.name, "ai_reply_suggestion")
+        self.assertEqual(row.ai_reply_suggestion, "Suggested reply text")
     
     def test_set_sentiment_english(self):
         """Test set_sentiment endpoint with English values - normalizes to Turkish."""
@@ -416,11 +495,11 @@ class TestIngestTicketUpdateEndpoints(unittest.TestCase):
         self.assertTrue(result.get("ok"))
         
         # Verify: English values normalized to Turkish
-        doc = frappe.get_doc("HD Ticket", self.ticket.name)
-        self.assertEqual(doc.last_sentiment, "Olumlu")  # Normalized to Turkish
-        self.assertEqual(doc.sentiment_trend, "Improving")
-        self.assertEqual(doc.effort_score, 2.5)
-        self.assertEqual(doc.effort_band, "Düşük")  # Normalized to Turkish
+        row = _read("HD Ticket", self.ticket.name, "last_sentiment", "sentiment_trend", "effort_score", "effort_band")
+        self.assertEqual(row.last_sentiment, "Olumlu")  # Normalized to Turkish
+        self.assertEqual(row.sentiment_trend, "Improving")
+        self.assertEqual(row.effort_score, 2.5)
+        self.assertEqual(row.effort_band, "Düşük")  # Normalized to Turkish
     
     def test_set_sentiment_turkish(self):
         """Test set_sentiment endpoint with Turkish values - stays Turkish."""
@@ -438,29 +517,22 @@ class TestIngestTicketUpdateEndpoints(unittest.TestCase):
         self.assertTrue(result.get("ok"))
         
         # Verify: Turkish variants normalized to canonical Turkish
-        doc = frappe.get_doc("HD Ticket", self.ticket.name)
-        self.assertEqual(doc.last_sentiment, "Olumlu")  # Canonical Turkish
-        self.assertEqual(doc.effort_band, "Düşük")  # Canonical Turkish
+        row = _read("HD Ticket", self.ticket.name, "last_sentiment", "effort_band")
+        self.assertEqual(row.last_sentiment, "Olumlu")  # Canonical Turkish
+        self.assertEqual(row.effort_band, "Düşük")  # Canonical Turkish
     
     def test_set_sentiment_synonyms(self):
         """Test set_sentiment with various synonyms - all normalize to Turkish."""
         if not self.has_last_sentiment:
             self.skipTest("last_sentiment field not available")
         
-        # Test positive synonyms → Olumlu
-        set_sentiment(self.ticket.name, last_sentiment="pos")
-        doc = frappe.get_doc("HD Ticket", self.ticket.name)
-        self.assertEqual(doc.last_sentiment, "Olumlu")
-        
-        # Test neutral synonyms → Nötr
-        set_sentiment(self.ticket.name, last_sentiment="neu")
-        doc.reload()
-        self.assertEqual(doc.last_sentiment, "Nötr")
-        
-        # Test negative synonyms → Olumsuz
-        set_sentiment(self.ticket.name, last_sentiment="neg")
-        doc.reload()
-        self.assertEqual(doc.last_sentiment, "Olumsuz")
+        # pos → Olumlu, neu → Nötr, neg → Olumsuz; each synonym runs even if another fails
+        for raw, expected in _SENTIMENT_SYNONYM_CASES:
+            with self.subTest(raw=raw):
+                set_sentiment(self.ticket.name, last_sentiment=raw)
+                self.assertEqual(
+                    frappe.db.get_value("HD Ticket", self.ticket.name, "last_sentiment"), expected
+                )
     
     def test_set_metrics(self):
         """Test set_metrics endpoint."""
@@ -475,9 +547,9 @@ class TestIngestTicketUpdateEndpoints(unittest.TestCase):
         self.assertTrue(result.get("ok"))
         
         # Verify
-        doc = frappe.get_doc("HD Ticket", self.ticket.name)
-        self.assertEqual(doc.effort_score, 4.2)
-        self.assertEqual(doc.cluster_hash, "abc123def456")
+        row = _read("HD Ticket", self.ticket.name, "effort_score", "cluster_hash")
+        self.assertEqual(row.effort_score, 4.2)
+        self.assertEqual(row.cluster_hash, "abc123def456")
     
     def test_update_ticket_general(self):
         """Test general update_ticket endpoint."""
@@ -499,10 +571,28 @@ class TestIngestTicketUpdateEndpoints(unittest.TestCase):
         self.assertIn("changed", result)
         
         # Verify: English normalized to Turkish
-        doc = frappe.get_doc("HD Ticket", self.ticket.name)
-        self.assertEqual(doc.ai_summary, "General summary")
-        self.assertEqual(doc.last_sentiment, "Nötr")  # Normalized to Turkish
-        self.assertEqual(doc.effort_score, 3.5)
+        row = _read("HD Ticket", self.ticket.name, "ai_summary", "last_sentiment", "effort_score")
+        self.assertEqual(row.ai_summary, "General summary")
+        self.assertEqual(row.last_sentiment, "Nötr")  # Normalized to Turkish
+        self.assertEqual(row.effort_score, 3.5)
+    
+    def test_update_ticket_link_field_runs_save(self):
+        """Link field changes go through doc.save(), not the single set_value fast path."""
+        from frappe.model.document import Document
+
+        with patch.object(Document, "save", autospec=True, side_effect=Document.save) as save:
+            result = update_ticket(
+                ticket=self.ticket.name,
+                fields={"agent_group": self.team.name},
+                append=0,
+                clean_html=1
+            )
+        self.assertTrue(result.get("ok"))
+        self.assertTrue(
+            any(c.args[0].doctype == "HD Ticket" for c in save.call_args_list),
+            "link field update must run HD Ticket save() hooks",
+        )
+        self.assertEqual(_read("HD Ticket", self.ticket.name, "agent_group").agent_group, self.team.name)
     
     def test_update_ticket_with_json_string(self):
         """Test update_ticket with JSON string fields."""
@@ -522,9 +612,26 @@ class TestIngestTicketUpdateEndpoints(unittest.TestCase):
         self.assertTrue(result.get("ok"))
         
         # Verify: English normalized to Turkish
-        doc = frappe.get_doc("HD Ticket", self.ticket.name)
-        self.assertEqual(doc.ai_summary, "JSON summary")
-        self.assertEqual(doc.effort_band, "Yüksek")  # Normalized to Turkish
+        row = _read("HD Ticket", self.ticket.name, "ai_summary", "effort_band")
+        self.assertEqual(row.ai_summary, "JSON summary")
+        self.assertEqual(row.effort_band, "Yüksek")  # Normalized to Turkish
+    
+    def test_update_ticket_with_dict(self):
+        """Test update_ticket with a dict (no JSON parsing)."""
+        if not (self.has_ai_summary and self.has_effort_band):
+            self.skipTest("Required fields not available")
+        
+        result = update_ticket(
+            ticket=self.ticket.name,
+            fields={"ai_summary": "Dict summary", "effort_band": "Low"},
+            append=0,
+            clean_html=1
+        )
+        self.assertTrue(result.get("ok"))
+        
+        row = _read("HD Ticket", self.ticket.name, "ai_summary", "effort_band")
+        self.assertEqual(row.ai_summary, "Dict summary")
+        self.assertEqual(row.effort_band, "Düşük")
     
     def test_update_ticket_invalid_field(self):
         """Test that invalid fields are ignored."""
@@ -552,33 +659,21 @@ class TestIngestProblemTicket(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """Check if Problem Ticket DocType exists."""
-        cls.problem_exists = frappe.db.table_exists("Problem Ticket")
-        if not cls.problem_exists:
-            import warnings
-            warnings.warn("Problem Ticket DocType not found - skipping Problem tests")
+        # Skip the whole class once (no per-test setUp/skipTest) when the DocType is missing
+        if not _table_exists("Problem Ticket"):
+            raise unittest.SkipTest("Problem Ticket DocType not available")
+        frappe.set_user("Administrator")
     
     def setUp(self):
         """Setup before each test."""
-        frappe.set_user("Administrator")
-        if not self.problem_exists:
-            self.skipTest("Problem Ticket DocType not available")
+        _ensure_admin()
     
     def tearDown(self):
         """Cleanup after each test."""
-        if not self.problem_exists:
-            return
-        frappe.set_user("Administrator")
+        _ensure_admin()
         # Clean up test problem tickets
-        test_problems = frappe.get_all(
-            "Problem Ticket",
-            filters={"subject": ["like", "_Test Problem%"]},
-            pluck="name"
-        )
-        for name in test_problems:
-            try:
-                frappe.delete_doc("Problem Ticket", name, force=1)
-            except Exception:
-                pass
+        # One DELETE for all test rows; throwaway fixtures need no controller hooks
+        frappe.db.delete("Problem Ticket", {"subject": ("like", "_Test Problem%")})
         frappe.db.commit()
     
     def test_upsert_problem_ticket_create(self):
@@ -600,10 +695,10 @@ class TestIngestProblemTicket(unittest.TestCase):
         self.assertIsNotNone(result.get("name"))
         
         # Verify
-        doc = frappe.get_doc("Problem Ticket", result["name"])
-        self.assertEqual(doc.subject, "_Test Problem Ticket 1")
-        self.assertEqual(doc.status, "Open")
-        self.assertEqual(doc.severity, "High")
+        row = _read("Problem Ticket", result["name"], "subject", "status", "severity")
+        self.assertEqual(row.subject, "_Test Problem Ticket 1")
+        self.assertEqual(row.status, "Open")
+        self.assertEqual(row.severity, "High")
     
     def test_upsert_problem_ticket_update(self):
         """Test updating an existing Problem Ticket."""
@@ -630,9 +725,9 @@ class TestIngestProblemTicket(unittest.TestCase):
         self.assertIn("status", result_update["changed"])
         
         # Verify
-        doc = frappe.get_doc("Problem Ticket", problem_name)
-        self.assertEqual(doc.status, "Investigating")
-        self.assertEqual(doc.root_cause, "Found the issue")
+        row = _read("Problem Ticket", problem_name, "status", "root_cause")
+        self.assertEqual(row.status, "Investigating")
+        self.assertEqual(row.root_cause, "Found the issue")
     
     def test_upsert_problem_ticket_lookup_by_subject(self):
         """Test upsert with lookup_by=subject."""
@@ -654,8 +749,8 @@ class TestIngestProblemTicket(unittest.TestCase):
         self.assertEqual(result2["name"], name1)
         
         # Verify
-        doc = frappe.get_doc("Problem Ticket", name1)
-        self.assertEqual(doc.status, "Resolved")
+        row = _read("Problem Ticket", name1, "status")
+        self.assertEqual(row.status, "Resolved")
     
     def test_get_problem_ticket(self):
         """Test get_problem_ticket endpoint."""
@@ -698,33 +793,21 @@ class TestIngestKBRequests(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """Check if KB DocType exists."""
-        cls.kb_exists = frappe.db.table_exists("Knowledge Base Update Request")
-        if not cls.kb_exists:
-            import warnings
-            warnings.warn("Knowledge Base Update Request DocType not found - skipping KB tests")
+        # Skip the whole class once (no per-test setUp/skipTest) when the DocType is missing
+        if not _table_exists("Knowledge Base Update Request"):
+            raise unittest.SkipTest("Knowledge Base Update Request DocType not available")
+        frappe.set_user("Administrator")
     
     def setUp(self):
         """Setup before each test."""
-        frappe.set_user("Administrator")
-        if not self.kb_exists:
-            self.skipTest("Knowledge Base Update Request DocType not available")
+        _ensure_admin()
     
     def tearDown(self):
         """Cleanup after each test."""
-        if not self.kb_exists:
-            return
-        frappe.set_user("Administrator")
+        _ensure_admin()
         # Clean up test KB requests
-        test_kbs = frappe.get_all(
-            "Knowledge Base Update Request",
-            filters={"subject": ["like", "_Test KB%"]},
-            pluck="name"
-        )
-        for name in test_kbs:
-            try:
-                frappe.delete_doc("Knowledge Base Update Request", name, force=1)
-            except Exception:
-                pass
+        # One DELETE for all test rows; throwaway fixtures need no controller hooks
+        frappe.db.delete("Knowledge Base Update Request", {"subject": ("like", "_Test KB%")})
         frappe.db.commit()
     
     def test_request_kb_new_article(self):
@@ -740,9 +823,9 @@ class TestIngestKBRequests(unittest.TestCase):
         self.assertEqual(result.get("change_type"), "New Article")
         
         # Verify
-        doc = frappe.get_doc("Knowledge Base Update Request", result["name"])
-        self.assertEqual(doc.change_type, "New Article")
-        self.assertEqual(doc.subject, "_Test KB New Article Request")
+        row = _read("Knowledge Base Update Request", result["name"], "change_type", "subject")
+        self.assertEqual(row.change_type, "New Article")
+        self.assertEqual(row.subject, "_Test KB New Article Request")
     
     def test_request_kb_fix(self):
         """Test request_kb_fix endpoint."""
@@ -796,11 +879,44 @@ class TestIngestAILog(unittest.TestCase):
         frappe.set_user("Administrator")
         cls.team = create_test_team()
         cls.ticket = create_test_ticket()
+        frappe.db.commit()
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the log rows written by this class with one DELETE."""
+        _ensure_admin()
+        # write() queues rows in Redis; flush first so every test row is in the table
+        ai_log.flush()
+        frappe.db.delete(ai_log._LOG_DT, {"ticket": cls.ticket.name})
+        frappe.db.commit()
     
     def setUp(self):
         """Setup before each test."""
-        frappe.set_user("Administrator")
+        _ensure_admin()
     
+    def test_write_queue_flush_lands_row(self):
+        """write() returns a pending name; the row exists only after flush()."""
+        event_ts = frappe.utils.add_to_date(frappe.utils.now_datetime(), minutes=-5)
+        name = ai_log.write(
+            self.ticket.name,
+            "queue_flush_test",
+            request={"q": 1},
+            response={"a": 2},
+            event_timestamp=event_ts,
+        )
+        self.assertTrue(name)
+        ai_log.flush()
+        row = _read(ai_log._LOG_DT, name, "ticket", "request", "creation", "subject")
+        self.assertIsNotNone(row, "queued log row was not written by flush()")
+        self.assertEqual(str(row.ticket), str(self.ticket.name))
+        self.assertEqual(json.loads(row.request), {"q": 1})
+        # creation is the event time, not the flush time
+        self.assertEqual(
+            frappe.utils.get_datetime(row.creation).replace(microsecond=0),
+            event_ts.replace(microsecond=0),
+        )
+        self.assertIn("queue_flush_test", row.subject)
+
     def test_log_ai_interaction_dict(self):
         """Test logging AI interaction with dict params."""
         request_data = {
@@ -848,26 +964,28 @@ class TestIngestEdgeCases(unittest.TestCase):
     def setUpClass(cls):
         """Check which fields exist."""
         frappe.set_user("Administrator")
-        meta = frappe.get_meta("HD Ticket")
-        cls.has_ai_summary = meta.has_field("ai_summary")
-        cls.has_last_sentiment = meta.has_field("last_sentiment")
-        cls.has_effort_band = meta.has_field("effort_band")
+        cls.has_ai_summary = _hd_ticket_has("ai_summary")
+        cls.has_last_sentiment = _hd_ticket_has("last_sentiment")
+        cls.has_effort_band = _hd_ticket_has("effort_band")
+        
+        # One ticket for the whole class: every test writes the fields it asserts on
+        # (ai_summary tests use append=0, so no per-test reset is needed)
+        cls.ticket = create_test_ticket(subject=f"_Test Edge Case {next(_TICKET_SEQ)}")
+        frappe.db.commit()
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Cleanup once after all tests."""
+        _ensure_admin()
+        try:
+            frappe.delete_doc("HD Ticket", cls.ticket.name, force=1)
+            frappe.db.commit()
+        except Exception:
+            pass
     
     def setUp(self):
         """Setup before each test."""
-        frappe.set_user("Administrator")
-        self.team = create_test_team()
-        self.ticket = create_test_ticket(subject=f"_Test Edge Case {frappe.utils.now()}")
-    
-    def tearDown(self):
-        """Cleanup after each test."""
-        frappe.set_user("Administrator")
-        if hasattr(self, "ticket") and self.ticket:
-            try:
-                frappe.delete_doc("HD Ticket", self.ticket.name, force=1)
-                frappe.db.commit()
-            except Exception:
-                pass
+        _ensure_admin()
     
     def test_update_nonexistent_ticket(self):
         """Test updating a non-existent ticket."""
@@ -893,6 +1011,16 @@ class TestIngestEdgeCases(unittest.TestCase):
         self.assertFalse(result.get("ok"))
         self.assertIn("error", result)
     
+    def test_update_ticket_invalid_link(self):
+        """Test that unknown link values are rejected before the ticket is saved."""
+        with self.assertRaises(frappe.ValidationError):
+            update_ticket(
+                ticket=self.ticket.name,
+                fields={"agent_group": "_Test Nonexistent Team"},
+                append=0,
+                clean_html=1
+            )
+    
     def test_set_sentiment_invalid_value(self):
         """Test setting sentiment with invalid value."""
         if not self.has_last_sentiment:
@@ -924,9 +1052,9 @@ class TestIngestEdgeCases(unittest.TestCase):
         self.assertTrue(result.get("ok"))
         
         # Verify: last_sentiment changed to Turkish, effort_band unchanged
-        doc = frappe.get_doc("HD Ticket", self.ticket.name)
-        self.assertEqual(doc.last_sentiment, "Olumsuz")  # Normalized to Turkish
-        self.assertEqual(doc.effort_band, "Düşük")  # Remains Turkish from initial set
+        row = _read("HD Ticket", self.ticket.name, "last_sentiment", "effort_band")
+        self.assertEqual(row.last_sentiment, "Olumsuz")  # Normalized to Turkish
+        self.assertEqual(row.effort_band, "Düşük")  # Remains Turkish from initial set
     
     def test_html_cleaning_in_update(self):
         """Test that HTML is properly cleaned when clean_html=1."""
@@ -943,10 +1071,10 @@ class TestIngestEdgeCases(unittest.TestCase):
         self.assertTrue(result.get("ok"))
         
         # Verify HTML removed
-        doc = frappe.get_doc("HD Ticket", self.ticket.name)
-        self.assertNotIn("<p>", doc.ai_summary)
-        self.assertNotIn("<b>", doc.ai_summary)
-        self.assertIn("bold", doc.ai_summary)
+        row = _read("HD Ticket", self.ticket.name, "ai_summary")
+        self.assertNotIn("<p>", row.ai_summary)
+        self.assertNotIn("<b>", row.ai_summary)
+        self.assertIn("bold", row.ai_summary)
     
     def test_html_preserved_when_clean_false(self):
         """Test that HTML is preserved when clean_html=0."""
@@ -963,8 +1091,8 @@ class TestIngestEdgeCases(unittest.TestCase):
         self.assertTrue(result.get("ok"))
         
         # Verify HTML preserved
-        doc = frappe.get_doc("HD Ticket", self.ticket.name)
-        self.assertIn("<p>", doc.ai_summary)
+        row = _read("HD Ticket", self.ticket.name, "ai_summary")
+        self.assertIn("<p>", row.ai_summary)
 
 
 # Run tests if executed directly
@@ -2,12 +2,14 @@ from __future__ import annotations
 
 from typing import Any, Dict, Optional, Tuple
 import json
+import logging
 
 import frappe
 from frappe.model.document import Document
 from frappe.utils import now_datetime, get_datetime, add_to_date
 import re
 
+from brv_license_app.api.license import clear_healthz_cache
 from brv_license_app.license_client import (
     get_client,
     LMFWCContractError,
@@ -30,30 +32,56 @@ STATUS_LOCK_HARD = "LOCK_HARD"
 
 class LicenseSettings(Document):
     """Server-side controller for Single DocType."""
-    pass
 
-# NOTE: escape '-' inside the character class to avoid bad range like ':'-"\s"
-_EXP_RE = re.compile(r"expired on\s+([\d:\-\s]+)\s*\(UTC\)", re.I)
+    def on_update(self):
+        # Uygulamanın kendi önbellekleri: banner HTML'i ve healthz alanları (commit sonrası tekrar silinir)
+        clear_banner_cache()
+        clear_healthz_cache()
+
+# NOTE: sabit genişlikli tarih/saat yakalanır; serbest karakter sınıfı uzun mesajlarda geri izlemeye yol açıyordu
+_EXP_RE = re.compile(r"expired on\s+(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})\s*\(UTC\)", re.I)
+
+# Sunucu hata mesajı sınıflandırıcısı: tek derlenmiş alternation, her hata için bir tarama.
+# "expired" (tam kelime) ile yalnızca activate'in gevşek kontrolünde kullanılan "expire"
+# (expires/expiry vb.) ayrı gruplardır; aynı konumda önce "expired" denenir.
+_ERR_CLASSIFIER = re.compile(
+    r"(?P<expired>expired)|(?P<expire>expire)"
+    r"|(?P<limit>activation limit|maximum activation)|(?P<idem>idempotency guard)",
+    re.I,
+)
+
+def _error_kinds(msg: Optional[str]) -> frozenset:
+    """Mesajda geçen hata türleri ("expired", "expire", "limit", "idem")."""
+    return frozenset(m.lastgroup for m in _ERR_CLASSIFIER.finditer(msg or ""))
 
 def _parse_expiry_from_msg(msg: str):
     try:
         m = _EXP_RE.search(msg or "")
         if not m:
             return None
-        return get_datetime(m.group(1).strip())
+        return get_datetime(m.group(1))
     except Exception:
+        # Biçim doğru ama tarih geçersiz olabilir (ör. ay 13)
         return None
 
 # -----------------------------
 # Whitelisted API
 # -----------------------------
 
+# Her whitelisted uç nokta Single'ı bir kez okur ve `_*_impl(doc, ...)` gövdesine geçirir;
+# aynı istek/iş içinde başka bir akış (ör. scheduler) zaten yüklenmiş doc'u doğrudan kullanır.
+
 @frappe.whitelist()
 def activate_license(license_key: Optional[str] = None, token: Optional[str] = None) -> Dict[str, Any]:
     """Licensi aktif et. Expired hatası gelirse dokümanı EXPIRED olarak işaretler ve expires_at'ı doldurur."""
-    doc = frappe.get_single("License Settings")
+    try:
+        return _activate_license_impl(frappe.get_single("License Settings"), license_key, token)
+    finally:
+        clear_banner_cache()
+
+def _activate_license_impl(doc: Document, license_key: Optional[str], token: Optional[str]) -> Dict[str, Any]:
     lk = (license_key or getattr(doc, "license_key", "") or "").strip()
-    LOG.info(f"activate_license: start lk={lk!r} token={mask_token(token)}")
+    LOG.info("activate_license: start lk=%r token=%s", lk, mask_token(token))
     if not lk:
         frappe.throw("License Key is required in settings or as parameter.")
 
@@ -61,13 +89,14 @@ def activate_license(license_key: Optional[str] = None, token: Optional[str] = N
 
     try:
         resp = client.activate(lk, token=token)
-        LOG.info(f"activate_license: response={compact_json(resp)}")
+        if LOG.isEnabledFor(logging.INFO):
+            LOG.info("activate_license: response=%s", compact_json(resp))
         _write_last_raw(doc, resp)
         payload = _extract_data(resp)
         _apply_activation_update(doc, payload)
         changed = _maybe_update_token_from_payload(doc, resp)
         LOG.info(
-            f"activate_license: token_changed={changed} current_token={mask_token(getattr(doc,'activation_token',None))}"
+            "activate_license: token_changed=%s current_token=%s", changed, mask_token(getattr(doc,'activation_token',None))
         )
         doc.save(ignore_permissions=True)
         return payload
@@ -80,20 +109,20 @@ def activate_license(license_key: Optional[str] = None, token: Optional[str] = N
         msg = str(e) or ""
 
         # payload içindeki canonical yapı: {"success":true,"data":{"errors":{code:[...]},"error_data":{code:{"status":..}}}
-        try:
-            data = (getattr(e, "payload", {}) or {}).get("data") or {}
-            errs = data.get("errors") or {}
+        # Sunucu gövdesi sözleşmeye uymayabilir: her seviye try yerine isinstance ile süzülür
+        payload = getattr(e, "payload", None)
+        data = payload.get("data") if isinstance(payload, dict) else None
+        if isinstance(data, dict):
+            errs = data.get("errors")
             if isinstance(errs, dict):
-                err_code = next(iter(errs.keys()), None)
-                if "lmfwc_rest_license_expired" in errs:
-                    expired = True
-            ed = data.get("error_data") or {}
-            if isinstance(ed, dict) and err_code in ed and isinstance(ed[err_code], dict):
-                err_status = ed[err_code].get("status")
-        except Exception:
-            pass
-
-        if "expire" in msg.lower():
+                err_code = next(iter(errs), None)
+                expired = "lmfwc_rest_license_expired" in errs
+            ed = data.get("error_data")
+            ed_entry = ed.get(err_code) if err_code and isinstance(ed, dict) else None
+            if isinstance(ed_entry, dict):
+                err_status = ed_entry.get("status")
+
+        if not _error_kinds(msg).isdisjoint(("expired", "expire")):
             expired = True
 
         if expired:
@@ -112,8 +141,8 @@ def activate_license(license_key: Optional[str] = None, token: Optional[str] = N
                 doc.grace_until = add_to_date(now_datetime(), hours=24)
             doc.last_validated = now_datetime()
 
-            # son hatayı debug için sakla (opsiyonel)
-            try:
+            # son hatayı debug için sakla (opsiyonel; alan şemada yoksa serileştirme yapılmaz)
+            if _has_field(doc, "last_error_raw"):
                 doc.set(
                     "last_error_raw",
                     json.dumps(
@@ -121,14 +150,12 @@ def activate_license(license_key: Optional[str] = None, token: Optional[str] = N
                         ensure_ascii=False,
                     ),
                 )
-            except Exception:
-                pass
 
             doc.save(ignore_permissions=True)
             frappe.throw("License is expired. Please renew your license.")
 
         # expired değilse genel hata akışı
-        LOG.error(f"{frappe.get_traceback()}\nAPI error: {e}")
+        LOG.error("%s\nAPI error: %s", frappe.get_traceback(), e)
         try:
             frappe.log_error(title="license_api_error", message=str(e))
         except Exception:
@@ -136,7 +163,7 @@ def activate_license(license_key: Optional[str] = None, token: Optional[str] = N
         frappe.throw("Operation failed. See Error Log for details.")
 
     except Exception as e:
-        LOG.exception(f"activate_license: unexpected error: {e}")
+        LOG.exception("activate_license: unexpected error: %s", e)
         try:
             frappe.log_error(title="license_unexpected_error", message=frappe.get_traceback())
         except Exception:
@@ -151,20 +178,26 @@ def reactivate_license(token: Optional[str] = None, license_key: Optional[str] =
     Burada, `activate_license` yerine doğrudan client.activate çağrılır ki
     LMFWCContractError (özellikle "maximum activation") yakalanıp retry yapılabilsin.
     """
-    doc = frappe.get_single("License Settings")
+    try:
+        return _reactivate_license_impl(frappe.get_single("License Settings"), token, license_key)
+    finally:
+        clear_banner_cache()
+
+def _reactivate_license_impl(doc: Document, token: Optional[str], license_key: Optional[str]) -> Dict[str, Any]:
     lk = (license_key or getattr(doc, "license_key", "") or "").strip()
     LOG.info(
-        f"reactivate_license: start lk={lk!r} incoming_token={mask_token(token)} saved_token={mask_token(getattr(doc,'activation_token',None))}"
+        "reactivate_license: start lk=%r incoming_token=%s saved_token=%s",
+        lk,
+        mask_token(token),
+        mask_token(getattr(doc,'activation_token',None)),
     )
     if not lk:
         frappe.throw("License Key is required in settings or as parameter.")
 
     # Preflight: token tazele
-    _preflight_refresh_token(doc, lk)
-
     # Efektif token: önce preflight'tan gelen; sonra kullanıcıdan gelen
-    eff_token = (getattr(doc, "activation_token", "") or "").strip() or (token or "").strip()
-    LOG.info(f"reactivate_license: effective_token={mask_token(eff_token)}")
+    eff_token = _preflight_refresh_token(doc, lk) or (token or "").strip()
+    LOG.info("reactivate_license: effective_token=%s", mask_token(eff_token))
     if not eff_token:
         frappe.throw("Activation token is required (not found in settings or validation response).")
 
@@ -175,22 +208,22 @@ def reactivate_license(token: Optional[str] = None, license_key: Optional[str] =
         return _activate_via_client(doc, lk, eff_token, client)
     except LMFWCContractError as e:
         msg = str(e)
-        if _is_expired_error(msg):
+        kinds = _error_kinds(msg)
+        if "expired" in kinds:
             _mark_expired(doc, msg)
             doc.save(ignore_permissions=True)
-            LOG.warning(f"reactivate_license: expired → status set EXPIRED. msg={msg}")
+            LOG.warning("reactivate_license: expired → status set EXPIRED. msg=%s", msg)
             frappe.throw("License is expired. Please renew your license.")
-        LOG.warning(f"reactivate_license: first attempt failed with: {msg}")
+        LOG.warning("reactivate_license: first attempt failed with: %s", msg)
         # Aktivasyon limitine takıldıysak: preflight + yeni token ile bir kez daha dene
-        if ("Activation limit" in msg) or ("maximum activation" in msg):
-            _preflight_refresh_token(doc, lk)
-            eff_token2 = (getattr(doc, "activation_token", "") or "").strip() or eff_token
+        if "limit" in kinds:
+            eff_token2 = _preflight_refresh_token(doc, lk) or eff_token
             if eff_token2 and eff_token2 != eff_token:
-                LOG.info(f"reactivate_license: retry with token={mask_token(eff_token2)}")
+                LOG.info("reactivate_license: retry with token=%s", mask_token(eff_token2))
                 try:
                     return _activate_via_client(doc, lk, eff_token2, client)
                 except LMFWCRequestError as re:
-                    if "idempotency guard" in str(re).lower():
+                    if "idem" in _error_kinds(str(re)):
                         LOG.warning("reactivate_license: idempotency guard hit on retry; advise user to retry shortly")
                         frappe.throw("Another activation attempt is still settling. Please retry in a few seconds.")
                     raise
@@ -198,78 +231,109 @@ def reactivate_license(token: Optional[str] = None, license_key: Optional[str] =
             frappe.throw("Activation limit reached on the server and no fresh token was issued. Please deactivate an existing activation or increase the limit.")
         # Diğer sözleşme hatalarında üst katmana aynı şekilde iletme yerine
         # kullanıcıya genel hata sunulur
-        LOG.error(f"reactivate_license: non-retryable contract error: {e}")
+        LOG.error("reactivate_license: non-retryable contract error: %s", e)
         frappe.throw("Operation failed. See Error Log for details.")
 
 @frappe.whitelist()
 def deactivate_license(token: Optional[str] = None, license_key: Optional[str] = None) -> Dict[str, Any]:
-    doc = frappe.get_single("License Settings")
+    try:
+        return _deactivate_license_impl(frappe.get_single("License Settings"), token, license_key)
+    finally:
+        clear_banner_cache()
+
+def _deactivate_license_impl(doc: Document, token: Optional[str], license_key: Optional[str]) -> Dict[str, Any]:
     lk = (license_key or getattr(doc, "license_key", "") or "").strip()
     LOG.info(
-        f"deactivate_license: start lk={lk!r} incoming_token={mask_token(token)} saved_token={mask_token(getattr(doc,'activation_token',None))}"
+        "deactivate_license: start lk=%r incoming_token=%s saved_token=%s",
+        lk,
+        mask_token(token),
+        mask_token(getattr(doc,'activation_token',None)),
     )
     if not lk:
         frappe.throw("License Key is required in settings or as parameter.")
 
     tok = (token or "").strip()
     if not tok:
-        _preflight_refresh_token(doc, lk)
-        tok = (getattr(doc, "activation_token", "") or "").strip() or None
-        LOG.info(f"deactivate_license: token after preflight={mask_token(tok)} (None means bulk)")
+        tok = _preflight_refresh_token(doc, lk) or None
+        LOG.info("deactivate_license: token after preflight=%s (None means bulk)", mask_token(tok))
 
     client = get_client()
     try:
         resp = client.deactivate(lk, token=tok or None)
-        LOG.info(f"deactivate_license: response={compact_json(resp)}")
+        if LOG.isEnabledFor(logging.INFO):
+            LOG.info("deactivate_license: response=%s", compact_json(resp))
         _write_last_raw(doc, resp)
         payload = _extract_data(resp)
         _apply_deactivation_update(doc, payload)
-        doc.status = STATUS_LOCK_HARD
-        doc.reason = "License deactivated"
-        doc.grace_until = now_datetime()
 
-        # ekle:
         # 1) mümkünse token'ı temizle – artık bu cihaz için geçersiz
         if getattr(doc, "activation_token", None):
             doc.activation_token = ""
 
-        # 2) sunucu durumunu senkron görmek için hemen validate çağır (best-effort)
-        try:
-            v = client.validate(lk)
-            LOG.info(f"deactivate_license: post-validate response={compact_json(v)}")
-            _write_last_raw(doc, v)
-            # burada yalnız counters/expiry güncellenir; UI zaten LOCK_HARD gösterecek
-            payload2 = _extract_data(v)
-            _apply_validation_update(doc, payload2)
-        except Exception as _e:
-            LOG.warning(f"deactivate_license: post-validate skipped due to: {_e}")
         # Policy: set hard lock immediately
-        doc.status = STATUS_LOCK_HARD
-        doc.reason = "License deactivated"
-        doc.grace_until = now_datetime()
+        _mark_hard_lock(doc, "License deactivated")
         doc.save(ignore_permissions=True)
+
+        # 2) sunucu durumunu senkron görmek için validate arka planda (best-effort);
+        #    kullanıcı ikinci HTTP turunu beklemez, iş commit sonrası çalışır
+        try:
+            frappe.enqueue(
+                "brv_license_app.brv_license_app.doctype.license_settings.license_settings.post_deactivate_validate",
+                queue="short",
+                enqueue_after_commit=True,
+                license_key=lk,
+            )
+        except Exception as _e:
+            LOG.warning("deactivate_license: post-validate not queued: %s", _e)
         return payload
     except (LMFWCRequestError, LMFWCContractError) as e:
-        LOG.error(f"{frappe.get_traceback()}\nAPI error: {e}")
-        doc.status = STATUS_LOCK_HARD
-        doc.reason = f"Deactivate failed: {e}"
-        doc.grace_until = now_datetime()
+        LOG.error("%s\nAPI error: %s", frappe.get_traceback(), e)
+        _mark_hard_lock(doc, f"Deactivate failed: {e}")
         doc.save(ignore_permissions=True)
         frappe.throw("Operation failed. See log file or Error Log for details.")
     except Exception as e:
-        LOG.exception(f"deactivate_license: unexpected error: {e}")
-        doc.status = STATUS_LOCK_HARD
-        doc.reason = f"Deactivate unexpected error: {e}"
-        doc.grace_until = now_datetime()
+        LOG.exception("deactivate_license: unexpected error: %s", e)
+        _mark_hard_lock(doc, f"Deactivate unexpected error: {e}")
         doc.save(ignore_permissions=True)
         frappe.throw(str(e))
 
+def post_deactivate_validate(license_key: str) -> None:
+    """deactivate_license sonrası arka plan işi: sunucudaki counters/expiry bilgisini dokümana alır.
+    Arada lisans yeniden aktif edildiyse dokunmaz; aksi halde LOCK_HARD politikası korunur.
+    """
+    try:
+        v = get_client().validate(license_key)
+    except Exception as e:
+        LOG.warning("post_deactivate_validate: skipped due to: %s", e)
+        return
+    if LOG.isEnabledFor(logging.INFO):
+        LOG.info("post_deactivate_validate: response=%s", compact_json(v))
+
+    doc = frappe.get_single("License Settings")
+    if doc.status != STATUS_LOCK_HARD or doc.reason != "License deactivated":
+        LOG.info("post_deactivate_validate: license state changed meanwhile (%s); not applied", doc.status)
+        return
+    # last_response_raw deactivate yanıtı olarak kalır (denetim için asıl kayıt);
+    # burada yalnız counters/expiry güncellenir, durum yine LOCK_HARD
+    grace_until = doc.grace_until
+    _apply_validation_update(doc, _extract_data(v))
+    doc.status = STATUS_LOCK_HARD
+    doc.reason = "License deactivated"
+    doc.grace_until = grace_until
+    doc.save(ignore_permissions=True)
+    clear_banner_cache()
+
 @frappe.whitelist()
 def validate_license(license_key: Optional[str] = None) -> Dict[str, Any]:
     """Licensi doğrula. Eğer doküman zaten EXPIRED ise uzaktan çağrı yapmadan EXPIRED’ı korur."""
-    doc = frappe.get_single("License Settings")
+    try:
+        return _validate_license_impl(frappe.get_single("License Settings"), license_key)
+    finally:
+        clear_banner_cache()
+
+def _validate_license_impl(doc: Document, license_key: Optional[str]) -> Dict[str, Any]:
     lk = (license_key or getattr(doc, "license_key", "") or "").strip()
-    LOG.info(f"validate_license: start lk={lk!r}")
+    LOG.info("validate_license: start lk=%r", lk)
     if not lk:
         frappe.throw("License Key is required in settings or as parameter.")
 
@@ -282,7 +346,8 @@ def validate_license(license_key: Optional[str] = None) -> Dict[str, Any]:
 
     try:
         resp = client.validate(lk)
-        LOG.info(f"validate_license: response={compact_json(resp)}")
+        if LOG.isEnabledFor(logging.INFO):
+            LOG.info("validate_license: response=%s", compact_json(resp))
         _write_last_raw(doc, resp)
         payload = _extract_data(resp)
 
@@ -293,19 +358,19 @@ def validate_license(license_key: Optional[str] = None) -> Dict[str, Any]:
 
         changed = _maybe_update_token_from_payload(doc, resp)
         LOG.info(
-            f"validate_license: token_changed={changed} current_token={mask_token(getattr(doc,'activation_token',None))}"
+            "validate_license: token_changed=%s current_token=%s", changed, mask_token(getattr(doc,'activation_token',None))
         )
         doc.save(ignore_permissions=True)
         return payload
 
     except (LMFWCRequestError, LMFWCContractError) as e:
-        LOG.error(f"{frappe.get_traceback()}\nAPI error: {e}")
+        LOG.error("%s\nAPI error: %s", frappe.get_traceback(), e)
         _apply_grace_on_failure(doc, reason=str(e))
         doc.save(ignore_permissions=True)
         frappe.throw("Operation failed. See Error Log for details.")
 
     except Exception as e:
-        LOG.exception(f"validate_license: unexpected error: {e}")
+        LOG.exception("validate_license: unexpected error: %s", e)
         _apply_grace_on_failure(doc, reason=f"Unexpected error: {e}")
         doc.save(ignore_permissions=True)
         frappe.throw(str(e))
@@ -314,7 +379,7 @@ def validate_license(license_key: Optional[str] = None) -> Dict[str, Any]:
 # Internal helpers
 # -----------------------------
 def _is_expired_error(msg: str) -> bool:
-    return "expired" in (msg or "").lower()
+    return "expired" in _error_kinds(msg)
 
 def _mark_expired(doc: Document, reason: str) -> None:
     doc.status = STATUS_EXPIRED
@@ -322,16 +387,29 @@ def _mark_expired(doc: Document, reason: str) -> None:
     # 24 saatlik tolerans penceresi
     doc.grace_until = add_to_date(now_datetime(), hours=24)
 
-def _set_if_exists(doc: Document, fieldname: str, value: Any) -> None:
+def _has_field(doc: Document, fieldname: str) -> bool:
+    # Meta Frappe tarafından site bazında önbelleklenir ve get_field bir dict aramasıdır;
+    # süreç düzeyinde ek önbellek çoklu sitede yanlış şemayı döndürebilirdi
     try:
-        if doc.meta.get_field(fieldname):
-            doc.set(fieldname, value)
+        return bool(doc.meta.get_field(fieldname))
     except Exception:
-        pass
+        return False
+
+def _mark_hard_lock(doc: Document, reason: str) -> None:
+    doc.status = STATUS_LOCK_HARD
+    doc.reason = reason
+    doc.grace_until = now_datetime()
+
+def _set_if_exists(doc: Document, fieldname: str, value: Any) -> None:
+    if _has_field(doc, fieldname):
+        doc.set(fieldname, value)
 
 def _write_last_raw(doc: Document, resp: Dict[str, Any]) -> None:
+    # Alan şemada yoksa yanıtı hiç serileştirme
+    if not _has_field(doc, "last_response_raw"):
+        return
     try:
-        _set_if_exists(doc, "last_response_raw", json.dumps(resp, ensure_ascii=False, separators=(",", ":")))
+        doc.set("last_response_raw", json.dumps(resp, ensure_ascii=False, separators=(",", ":")))
     except Exception:
         pass
 
@@ -344,45 +422,56 @@ def _extract_data(resp: Dict[str, Any]) -> Dict[str, Any]:
 # ki retry/policy uygulanabilsin. activate_license ile aynı yan etkileri üretir.
 def _activate_via_client(doc: Document, lk: str, token: Optional[str], client) -> Dict[str, Any]:
     resp = client.activate(lk, token=token)
-    LOG.info(f"activate_license: response={compact_json(resp)}")
+    if LOG.isEnabledFor(logging.INFO):
+        LOG.info("activate_license: response=%s", compact_json(resp))
     _write_last_raw(doc, resp)
     payload = _extract_data(resp)
     _apply_activation_update(doc, payload)
     changed = _maybe_update_token_from_payload(doc, resp)
     LOG.info(
-        f"activate_license: token_changed={changed} current_token={mask_token(getattr(doc,'activation_token',None))}"
+        "activate_license: token_changed=%s current_token=%s", changed, mask_token(getattr(doc,'activation_token',None))
     )
     doc.save(ignore_permissions=True)
     return payload
 
-def _preflight_refresh_token(doc: Document, lk: str) -> None:
-    LOG.info(f"preflight_refresh_token: validating lk={lk!r}")
+def _current_token(doc: Document) -> str:
+    return (getattr(doc, "activation_token", "") or "").strip()
+
+def _preflight_refresh_token(doc: Document, lk: str) -> str:
+    """Validate ile token'ı tazeler; preflight sonrası geçerli (strip edilmiş) token'ı döner."""
+    LOG.info("preflight_refresh_token: validating lk=%r", lk)
+    before = _current_token(doc)
     client = get_client()
     try:
         v = client.validate(lk)
-        LOG.info(f"preflight_refresh_token: validate_response={compact_json(v)}")
+        if LOG.isEnabledFor(logging.INFO):
+            LOG.info("preflight_refresh_token: validate_response=%s", compact_json(v))
         _write_last_raw(doc, v)
-        before = (getattr(doc, "activation_token", "") or "").strip()
-        changed = _maybe_update_token_from_payload(doc, v)
-        after = (getattr(doc, "activation_token", "") or "").strip()
+        changed = _maybe_update_token_from_payload(doc, v, current=before)
+        after = _current_token(doc) if changed else before
         LOG.info(
-            f"preflight_refresh_token: token_changed={changed} before={mask_token(before)} after={mask_token(after)}"
+            "preflight_refresh_token: token_changed=%s before=%s after=%s",
+            changed,
+            mask_token(before),
+            mask_token(after),
         )
         if changed:
             doc.reason = "Token rotated from validate"
+        return after
     except Exception as e:
-        LOG.error(f"preflight_refresh_token: failed with {e}")
+        LOG.error("preflight_refresh_token: failed with %s", e)
         # Intentionally silent for callers
-        pass
+        return before
 
-def _maybe_update_token_from_payload(doc: Document, payload: Dict[str, Any]) -> bool:
+def _maybe_update_token_from_payload(
+    doc: Document, payload: Dict[str, Any], *, current: Optional[str] = None
+) -> bool:
     latest = _extract_latest_token(payload)
-    LOG.info(
-        f"maybe_update_token: latest_from_payload={mask_token(latest)} current={mask_token(getattr(doc,'activation_token',None))}"
-    )
+    if current is None:
+        current = _current_token(doc)
+    LOG.info("maybe_update_token: latest_from_payload=%s current=%s", mask_token(latest), mask_token(current))
     if not latest:
         return False
-    current = (getattr(doc, "activation_token", "") or "").strip()
     if latest != current:
         _set_if_exists(doc, "activation_token", latest)
         return True
@@ -396,7 +485,7 @@ def _extract_latest_token(payload: Dict[str, Any]) -> Optional[str]:
 
     if isinstance(activation_data, dict):
         tok = activation_data.get("token")
-        LOG.info(f"extract_latest_token: single-object token={mask_token(tok)}")
+        LOG.info("extract_latest_token: single-object token=%s", mask_token(tok))
         return str(tok).strip() if tok else None
 
     if not isinstance(activation_data, list) or not activation_data:
@@ -411,20 +500,32 @@ def _extract_latest_token(payload: Dict[str, Any]) -> Optional[str]:
         except Exception:
             return 0.0
 
-    def score(item: Dict[str, Any]) -> Tuple[int, float]:
-        is_active = 1 if not item.get("deactivated_at") else 0
-        ts = parse_ts(item.get("updated_at")) or parse_ts(item.get("created_at"))
-        return (is_active, ts)
-
-    candidates = [x for x in activation_data if isinstance(x, dict) and x.get("token")]
-    LOG.info(f"extract_latest_token: candidates={len(candidates)}")
-    if not candidates:
+    # Tek geçiş: (aktif mi, zaman) anahtarıyla en iyisi; eşitlikte ilk öğe kalır.
+    # Aktif bir aday bulunduktan sonra pasif öğelerin tarihleri hiç parse edilmez.
+    best: Optional[Dict[str, Any]] = None
+    best_key: Tuple[int, float] = (-1, 0.0)
+    candidates = 0
+    for item in activation_data:
+        if not isinstance(item, dict) or not item.get("token"):
+            continue
+        candidates += 1
+        is_active = 0 if item.get("deactivated_at") else 1
+        if is_active < best_key[0]:
+            continue
+        key = (is_active, parse_ts(item.get("updated_at")) or parse_ts(item.get("created_at")))
+        if key > best_key:
+            best, best_key = item, key
+    LOG.info("extract_latest_token: candidates=%d", candidates)
+    if best is None:
         return None
 
-    best = max(candidates, key=score)
     tok = best.get("token")
     LOG.info(
-        f"extract_latest_token: chosen_token={mask_token(tok)} active={not best.get('deactivated_at')} updated_at={best.get('updated_at')} created_at={best.get('created_at')}"
+        "extract_latest_token: chosen_token=%s active=%s updated_at=%s created_at=%s",
+        mask_token(tok),
+        not best.get("deactivated_at"),
+        best.get("updated_at"),
+        best.get("created_at"),
     )
     return str(tok).strip() if tok else None
 
@@ -435,14 +536,17 @@ def _apply_activation_update(doc: Document, data: Dict[str, Any]) -> None:
     doc.last_validated = now_datetime()
     _clear_grace(doc)
     LOG.info(
-        f"apply_activation_update: status={doc.status} expires_at={getattr(doc,'expires_at',None)} last_validated={doc.last_validated}"
+        "apply_activation_update: status=%s expires_at=%s last_validated=%s",
+        doc.status,
+        getattr(doc, "expires_at", None),
+        doc.last_validated,
     )
 
 def _apply_deactivation_update(doc: Document, data: Dict[str, Any]) -> None:
     _apply_expiry(doc, data)
     doc.status = STATUS_DEACTIVATED
     doc.reason = "Deactivated"
-    LOG.info(f"apply_deactivation_update: status={doc.status} expires_at={getattr(doc,'expires_at',None)}")
+    LOG.info("apply_deactivation_update: status=%s expires_at=%s", doc.status, getattr(doc, "expires_at", None))
 
 def _apply_validation_update(doc: Document, data: Dict[str, Any]) -> None:
     _apply_expiry(doc, data)
@@ -488,8 +592,11 @@ def _apply_validation_update(doc: Document, data: Dict[str, Any]) -> None:
     doc.last_validated = now_datetime()
     _clear_grace(doc)
     LOG.info(
-        f"apply_validation_update: status={doc.status} active={active} "
-        f"expires_at={getattr(doc,'expires_at',None)} last_validated={doc.last_validated}"
+        "apply_validation_update: status=%s active=%s expires_at=%s last_validated=%s",
+        doc.status,
+        active,
+        getattr(doc, "expires_at", None),
+        doc.last_validated,
     )
 
 
@@ -539,25 +646,51 @@ def _apply_grace_on_failure(doc: Document, *, reason: str) -> None:
 
     doc.grace_until = now
     LOG.warning(
-        f"apply_grace_on_failure: status={doc.status} delta_h={delta_hours:.2f} grace_until={doc.grace_until}"
+        "apply_grace_on_failure: status=%s delta_h=%.2f grace_until=%s", doc.status, delta_hours, doc.grace_until
     )
 
+# Banner her desk sayfasında çizilir: HTML 30 sn Redis'te tutulur, lisans değişince silinir
+_BANNER_CACHE_KEY = "brv_license:banner_html"
+_BANNER_TTL = 30
+
+# Durum → hazır class="..." parçası (sabit metin, kaçış gerekmez)
+_BANNER_CLASS = {
+    STATUS_VALIDATED: '<div class="indicator green">',
+    STATUS_ACTIVE: '<div class="indicator blue">',
+    STATUS_GRACE_SOFT: '<div class="indicator orange">',
+    STATUS_LOCK_HARD: '<div class="indicator red">',
+    STATUS_DEACTIVATED: '<div class="indicator gray">',
+}
+_BANNER_CLASS_DEFAULT = '<div class="indicator gray">'
+
+def clear_banner_cache(doc=None, method=None) -> None:
+    """Önbellekteki banner HTML'ini sil (mutator'lar ve LicenseSettings.on_update).
+    Silme commit'ten önce olur: arada gelen bir get_status_banner eski satırı yeniden yazabilir,
+    bu yüzden anahtar commit sonrası bir kez daha silinir.
+    """
+    frappe.cache().delete_value(_BANNER_CACHE_KEY)
+    frappe.db.after_commit.add(_delete_banner_key)
+
+def _delete_banner_key() -> None:
+    frappe.cache().delete_value(_BANNER_CACHE_KEY)
+
 def get_status_banner() -> str:
-    doc = frappe.get_single("License Settings")
+    cache = frappe.cache()
+    html = cache.get_value(_BANNER_CACHE_KEY)
+    if html is None:
+        html = _status_banner_impl(frappe.get_single("License Settings"))
+        # get_value(generator=) süresiz yazar; TTL yalnızca set_value ile verilebilir
+        cache.set_value(_BANNER_CACHE_KEY, html, expires_in_sec=_BANNER_TTL)
+    return html
+
+def _status_banner_impl(doc: Document) -> str:
     status = getattr(doc, "status", None) or STATUS_UNCONFIGURED
     msg = getattr(doc, "reason", None) or ""
     remain = getattr(doc, "remaining", None)
     remain_display = remain if remain is not None else "?"
-    cls = {
-        STATUS_VALIDATED: "indicator green",
-        STATUS_ACTIVE: "indicator blue",
-        STATUS_GRACE_SOFT: "indicator orange",
-        STATUS_LOCK_HARD: "indicator red",
-        STATUS_DEACTIVATED: "indicator gray",
-    }.get(status, "indicator gray")
     return (
-        f'<div class="{cls}"><b>Status:</b> {status} &nbsp; <b>Remaining:</b> {remain_display} '
-        f"&nbsp; <span>{frappe.utils.escape_html(msg or '')}</span></div>"
+        f"{_BANNER_CLASS.get(status, _BANNER_CLASS_DEFAULT)}<b>Status:</b> {status} &nbsp; <b>Remaining:</b> {remain_display} "
+        f"&nbsp; <span>{frappe.utils.escape_html(msg) if msg else ''}</span></div>"
     )
 
 # --------------------------------------------------------------------
@@ -570,6 +703,32 @@ from frappe.utils.synchronization import filelock  # type: ignore
 from frappe.utils.file_lock import LockTimeoutError  # type: ignore
 
 
+# Sağlıklı lisansta (VALIDATED, yakın zamanda doğrulanmış, bitişe uzak) uzak çağrı atlanır;
+# böylece 6 saatlik cron pratikte 12 saatte bir sunucuya gider. Sorunlu durumlar her çalışmada doğrulanır.
+# Eşik iki cron periyodunun (6s / 12s) arasındadır: cron birkaç saniye kaysa da 6 saat önceki
+# doğrulama taze sayılır, 12 saat önceki bayat sayılır.
+_AUTO_VALIDATE_FRESH_HOURS = 11
+_AUTO_VALIDATE_EXPIRY_MARGIN_HOURS = 48
+
+
+def _needs_remote_validate(doc: Document) -> bool:
+    if getattr(doc, "status", None) != STATUS_VALIDATED:
+        return True
+    last_ok = getattr(doc, "last_validated", None)
+    if not last_ok:
+        return True
+    now = now_datetime()
+    try:
+        if (now - get_datetime(last_ok)).total_seconds() > _AUTO_VALIDATE_FRESH_HOURS * 3600:
+            return True
+        ex = getattr(doc, "expires_at", None)
+        if ex and (get_datetime(ex) - now).total_seconds() < _AUTO_VALIDATE_EXPIRY_MARGIN_HOURS * 3600:
+            return True
+    except Exception:
+        return True
+    return False
+
+
 def scheduled_auto_validate() -> None:
     LOG.info("scheduled_auto_validate: start")
     try:
@@ -579,10 +738,18 @@ def scheduled_auto_validate() -> None:
             if not getattr(doc, "license_key", None):
                 LOG.warning("scheduled_auto_validate: no license_key set; skipping")
                 return
-            result = validate_license(doc.license_key)
-            LOG.info(f"scheduled_auto_validate: OK resp={compact_json(result)}")
+            if not _needs_remote_validate(doc):
+                LOG.info("scheduled_auto_validate: skipped (validated recently, expiry not near)")
+                return
+            # Aynı doc ile doğrula: ikinci get_single ve ayrı save yok
+            try:
+                result = _validate_license_impl(doc, doc.license_key)
+            finally:
+                clear_banner_cache()
+            if LOG.isEnabledFor(logging.INFO):
+                LOG.info("scheduled_auto_validate: OK resp=%s", compact_json(result))
     except LockTimeoutError:
         # Another process is running the same job — skip quietly
         LOG.info("scheduled_auto_validate: skipped (another run is in progress)")
     except Exception as e:
-        LOG.exception(f"scheduled_auto_validate: failed: {e}")
+        LOG.exception("scheduled_auto_validate: failed: %s", e)
@@ -106,6 +106,9 @@ class TestLicenseSettings(FrappeTestCase):
         )
         self.get_single_patcher.start()
 
+        # Banner is cached in Redis; start every test from a cold cache
+        ls.clear_banner_cache()
+
     def tearDown(self):
         self.now_patcher.stop()
         self.log_patcher.stop()
@@ -324,29 +327,57 @@ class TestLicenseSettings(FrappeTestCase):
             "success": True,
             "data": {"ok": True},
         }
-        # Post-validate after deactivate (best-effort) — keep it simple
-        post_validate = {
-            "success": True,
-            "data": {
-                "activationData": [],
-                "timesActivated": 0,
-            },
-        }
-
         client = MagicMock()
-        client.validate.side_effect = [preflight_validate, post_validate]
+        client.validate.return_value = preflight_validate
         client.deactivate.return_value = deactivate_resp
 
-        with patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings.get_client", return_value=client):
+        with patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings.get_client", return_value=client), \
+                patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings.frappe.enqueue") as enqueue:
             out = ls.deactivate_license()
 
+        # Post-validate is queued instead of blocking the request
+        client.validate.assert_called_once_with("LIC-DEC")
+        enqueue.assert_called_once()
+        self.assertEqual(enqueue.call_args.kwargs["license_key"], "LIC-DEC")
+        self.assertEqual(self.doc._saves, 1)
+
         self.assertEqual(out, deactivate_resp["data"])
         self.assertEqual(self.doc.status, ls.STATUS_LOCK_HARD)
         self.assertEqual(self.doc.reason, "License deactivated")
         self.assertIsNotNone(self.doc.grace_until)
-        self.assertIn("last_response_raw", self.doc.__dict__)
+        # Post-validate does not overwrite the deactivate response
+        self.assertEqual(json.loads(self.doc.last_response_raw), deactivate_resp)
         self.assertFalse(self.doc.activation_token)
 
+    def test_post_deactivate_validate_updates_expiry_and_keeps_lock(self):
+        self.doc.status = ls.STATUS_LOCK_HARD
+        self.doc.reason = "License deactivated"
+        self.doc.grace_until = NOW
+        client = MagicMock()
+        client.validate.return_value = {
+            "success": True,
+            "data": {"expiresAt": "2025-12-31 00:00:00", "activationData": [], "timesActivated": 0},
+        }
+        with patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings.get_client", return_value=client):
+            ls.post_deactivate_validate("LIC-DEC")
+
+        self.assertEqual(self.doc.expires_at, _ts("2025-12-31 00:00:00"))
+        self.assertEqual(self.doc.status, ls.STATUS_LOCK_HARD)
+        self.assertEqual(self.doc.reason, "License deactivated")
+        self.assertEqual(self.doc.grace_until, NOW)
+        self.assertEqual(self.doc._saves, 1)
+
+    def test_post_deactivate_validate_ignores_reactivated_license(self):
+        self.doc.status = ls.STATUS_ACTIVE
+        self.doc.reason = "Activated"
+        client = MagicMock()
+        client.validate.return_value = {"success": True, "data": {"activationData": [], "timesActivated": 0}}
+        with patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings.get_client", return_value=client):
+            ls.post_deactivate_validate("LIC-DEC")
+
+        self.assertEqual(self.doc.status, ls.STATUS_ACTIVE)
+        self.assertEqual(self.doc._saves, 0)
+
     # ------------------------
     # get_status_banner
     # ------------------------
@@ -362,6 +393,37 @@ class TestLicenseSettings(FrappeTestCase):
         # Ensure content got escaped
         self.assertNotIn("<script>", html)
 
+    def test_get_status_banner_cached_until_mutation(self):
+        self.doc.status = ls.STATUS_VALIDATED
+        self.doc.reason = ""
+        first = ls.get_status_banner()
+        self.assertIn("indicator green", first)
+
+        # Served from cache: direct doc changes are not seen
+        self.doc.status = ls.STATUS_LOCK_HARD
+        self.assertEqual(ls.get_status_banner(), first)
+
+        # A mutator run (even a failing one) drops the cached HTML
+        with self.assertRaises(frappe.ValidationError):
+            ls.validate_license()
+        self.assertIn("indicator red", ls.get_status_banner())
+
+    def test_on_update_drops_banner_and_healthz_cache(self):
+        from brv_license_app.api import license as license_api
+
+        cache = frappe.cache()
+        cache.set_value(ls._BANNER_CACHE_KEY, "stale-banner")
+        cache.set_value(license_api._HEALTHZ_CACHE_KEY, {"status": "stale"})
+
+        ls.LicenseSettings.on_update(self.doc)
+        self.assertIsNone(cache.get_value(ls._BANNER_CACHE_KEY))
+        self.assertIsNone(cache.get_value(license_api._HEALTHZ_CACHE_KEY))
+
+        # A reader that refilled the cache before commit is dropped again after it
+        cache.set_value(ls._BANNER_CACHE_KEY, "refilled-before-commit")
+        frappe.db.after_commit.run()
+        self.assertIsNone(cache.get_value(ls._BANNER_CACHE_KEY))
+
     # ------------------------
     # scheduled_auto_validate
     # ------------------------
@@ -373,11 +435,50 @@ class TestLicenseSettings(FrappeTestCase):
     def test_scheduled_auto_validate_calls_validate_when_key_present(self):
         self.doc.license_key = "LIC-SCHED"
 
-        with patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings.validate_license") as validate:
+        with patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings._validate_license_impl") as validate:
             validate.return_value = {"ok": True}
             # Should not raise
             ls.scheduled_auto_validate()
-            validate.assert_called_once_with("LIC-SCHED")
+            # The already-loaded doc is reused; no second get_single
+            validate.assert_called_once_with(self.doc, "LIC-SCHED")
+
+    def test_scheduled_auto_validate_skips_healthy_recent_license(self):
+        self.doc.license_key = "LIC-HEALTHY"
+        self.doc.status = ls.STATUS_VALIDATED
+        self.doc.last_validated = NOW - timedelta(hours=5)
+        self.doc.expires_at = NOW + timedelta(days=30)
+
+        with patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings._validate_license_impl") as validate:
+            ls.scheduled_auto_validate()
+            validate.assert_not_called()
+
+    def test_scheduled_auto_validate_skips_previous_cron_run_despite_jitter(self):
+        """A validation from the previous 6-hourly run stays fresh whether cron fires early or late."""
+        self.doc.license_key = "LIC-JITTER"
+        self.doc.status = ls.STATUS_VALIDATED
+        self.doc.expires_at = NOW + timedelta(days=30)
+        for offset in (timedelta(seconds=-5), timedelta(seconds=5)):
+            with self.subTest(offset=offset):
+                self.doc.last_validated = NOW - timedelta(hours=6) + offset
+                with patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings._validate_license_impl") as validate:
+                    ls.scheduled_auto_validate()
+                    validate.assert_not_called()
+
+    def test_scheduled_auto_validate_runs_when_stale_or_near_expiry(self):
+        self.doc.license_key = "LIC-CHECK"
+        self.doc.status = ls.STATUS_VALIDATED
+        cases = {
+            "stale": (NOW - timedelta(hours=12), NOW + timedelta(days=30)),
+            "near_expiry": (NOW - timedelta(hours=1), NOW + timedelta(hours=12)),
+        }
+        for label, (last_validated, expires_at) in cases.items():
+            with self.subTest(label):
+                self.doc.last_validated = last_validated
+                self.doc.expires_at = expires_at
+                with patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings._validate_license_impl") as validate:
+                    validate.return_value = {"ok": True}
+                    ls.scheduled_auto_validate()
+                    validate.assert_called_once_with(self.doc, "LIC-CHECK")
 
     def test_scheduled_auto_validate_expired_license_recovers_when_extended(self):
         """
@@ -427,6 +528,14 @@ class TestLicenseSettings(FrappeTestCase):
         self.assertIsNotNone(result)
         self.assertEqual(result, _ts("2025-10-15 12:30:45"))
 
+    def test_parse_expiry_from_msg_iso_separator(self):
+        result = ls._parse_expiry_from_msg("License expired on 2025-10-15T12:30:45 (UTC)")
+        self.assertEqual(result, _ts("2025-10-15 12:30:45"))
+
+    def test_parse_expiry_from_msg_long_garbage_is_fast(self):
+        msg = "expired on " + "1 " * 50_000 + "x"
+        self.assertIsNone(ls._parse_expiry_from_msg(msg))
+
     def test_parse_expiry_from_msg_no_match(self):
         msg = "Some other error message"
         result = ls._parse_expiry_from_msg(msg)
@@ -443,6 +552,15 @@ class TestLicenseSettings(FrappeTestCase):
         self.assertFalse(ls._is_expired_error("Some other error"))
         self.assertFalse(ls._is_expired_error(None))
 
+    def test_error_kinds(self):
+        self.assertEqual(ls._error_kinds("Activation limit reached"), {"limit"})
+        self.assertEqual(ls._error_kinds("maximum activation count; license expired"), {"limit", "expired"})
+        self.assertEqual(ls._error_kinds("Duplicate activate blocked by idempotency guard"), {"idem"})
+        self.assertEqual(ls._error_kinds(None), frozenset())
+        # "expires"/"expiry" are not an expired error outside activate's loose check
+        self.assertEqual(ls._error_kinds("Activation limit reached; license expires 2026-01-01"), {"limit", "expire"})
+        self.assertFalse(ls._is_expired_error("token expires soon"))
+
     def test_mark_expired(self):
         doc = _StubDoc()
         ls._mark_expired(doc, "Test expiration")
@@ -450,6 +568,13 @@ class TestLicenseSettings(FrappeTestCase):
         self.assertEqual(doc.reason, "Test expiration")
         self.assertEqual(doc.grace_until, NOW)
 
+    def test_mark_hard_lock(self):
+        doc = _StubDoc()
+        ls._mark_hard_lock(doc, "License deactivated")
+        self.assertEqual(doc.status, ls.STATUS_LOCK_HARD)
+        self.assertEqual(doc.reason, "License deactivated")
+        self.assertEqual(doc.grace_until, NOW)
+
     def test_set_if_exists(self):
         doc = _StubDoc()
         ls._set_if_exists(doc, "status", "TEST")
@@ -463,6 +588,14 @@ class TestLicenseSettings(FrappeTestCase):
         parsed = json.loads(doc.last_response_raw)
         self.assertEqual(parsed["success"], True)
 
+    def test_write_last_raw_skips_missing_field(self):
+        doc = _StubDoc()
+        doc.meta = types.SimpleNamespace(get_field=lambda name: None)
+        with patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings.json.dumps") as dumps:
+            ls._write_last_raw(doc, {"success": True})
+        dumps.assert_not_called()
+        self.assertIsNone(doc.last_response_raw)
+
     def test_extract_data_with_data_key(self):
         resp = {"success": True, "data": {"foo": "bar"}}
         result = ls._extract_data(resp)
@@ -529,6 +662,25 @@ class TestLicenseSettings(FrappeTestCase):
         result = ls._extract_latest_token(payload)
         self.assertEqual(result, "tok-active")
 
+    def test_extract_latest_token_skips_inactive_timestamps_once_active_found(self):
+        payload = {
+            "data": {
+                "activationData": [
+                    {"token": "tok-active", "deactivated_at": None, "updated_at": "2025-10-14 10:00:00"},
+                    {"token": "tok-gone", "deactivated_at": "2025-10-15 00:00:00", "updated_at": "2025-10-16 10:00:00"},
+                    {"token": "tok-no-ts", "deactivated_at": None},
+                ]
+            }
+        }
+        with patch(
+            "brv_license_app.brv_license_app.doctype.license_settings.license_settings.get_datetime",
+            side_effect=lambda s: _ts(s),
+        ) as gd:
+            result = ls._extract_latest_token(payload)
+        self.assertEqual(result, "tok-active")
+        # Only the active entry with a timestamp is parsed
+        gd.assert_called_once_with("2025-10-14 10:00:00")
+
     def test_extract_latest_token_no_data(self):
         payload = {"data": {}}
         result = ls._extract_latest_token(payload)
@@ -736,6 +888,24 @@ class TestLicenseSettings(FrappeTestCase):
     # ------------------------
     # Error handling tests
     # ------------------------
+    def test_activate_license_tolerates_malformed_error_payload(self):
+        self.doc.license_key = "LIC-ODD"
+        for label, body in {
+            "payload_not_dict": "oops",
+            "data_list": {"data": []},
+            "errors_list": {"data": {"errors": ["x"], "error_data": []}},
+        }.items():
+            with self.subTest(label):
+                exc = LMFWCContractError("License expired on 2025-10-10 00:00:00 (UTC)")
+                setattr(exc, "payload", body)
+                client = MagicMock()
+                client.activate.side_effect = exc
+                with patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings.get_client", return_value=client):
+                    with self.assertRaises(frappe.ValidationError):
+                        ls.activate_license()
+                # Message alone still classifies the error as expired
+                self.assertEqual(self.doc.status, ls.STATUS_EXPIRED)
+
     def test_activate_license_missing_license_key(self):
         self.doc.license_key = None
         with self.assertRaises(frappe.ValidationError):
@@ -784,19 +954,21 @@ class TestLicenseSettings(FrappeTestCase):
         client.validate.return_value = payload
         
         with patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings.get_client", return_value=client):
-            ls._preflight_refresh_token(self.doc, "LIC-PRE")
+            tok = ls._preflight_refresh_token(self.doc, "LIC-PRE")
         
         self.assertEqual(self.doc.activation_token, "new-token")
+        self.assertEqual(tok, "new-token")
 
     def test_preflight_refresh_token_handles_errors_silently(self):
         self.doc.license_key = "LIC-FAIL"
+        self.doc.activation_token = " kept-token "
         
         client = MagicMock()
         client.validate.side_effect = Exception("Network failure")
         
         with patch("brv_license_app.brv_license_app.doctype.license_settings.license_settings.get_client", return_value=client):
-            # Should not raise
-            ls._preflight_refresh_token(self.doc, "LIC-FAIL")
+            # Should not raise; the pre-existing token is returned
+            self.assertEqual(ls._preflight_refresh_token(self.doc, "LIC-FAIL"), "kept-token")
 
     # ------------------------
     # Reactivate retry logic tests
@@ -14,6 +14,10 @@ auth_hooks = ["brv_license_app.overrides.enforce_request"]
 
 # 6 saatte bir otomatik doğrulama - 48 saat grace period içinde 8 deneme şansı
 scheduler_events = {
+    # Kuyruktaki AI Interaction Log satırlarını toplu yaz
+    "all": [
+        "brv_license_app.api.ai_log.flush",
+    ],
     "cron": {
         "0 */6 * * *": [
             "brv_license_app.brv_license_app.doctype.license_settings.license_settings.scheduled_auto_validate"
@@ -31,6 +35,17 @@ app_include_js = [
 # Oturum açılışında istemciye lisans özetini gönder
 boot_session = "brv_license_app.overrides.boot_session"
 
+# bench clear-cache / migrate ve şema değişikliklerinde meta'dan türetilen önbellekleri temizle
+clear_cache = "brv_license_app.api.ingest.clear_meta_cache"
+doc_events = {
+    dt: {"on_update": "brv_license_app.api.ingest.clear_meta_cache"}
+    for dt in ("DocType", "Custom Field")
+}
+doc_events["File"] = {
+    "on_update": "brv_license_app.api.ingest.clear_file_cache",
+    "on_trash": "brv_license_app.api.ingest.clear_file_cache",
+}
+
 # Her migrate sonrasında site_config.json içine lisans/e-posta varsayılanlarını uygula
 after_migrate = "brv_license_app.utils.site_config.ensure_license_site_config"
 
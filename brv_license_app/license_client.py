@@ -34,6 +34,7 @@ client.validate("LICENSE-KEY-123")
 from __future__ import annotations
 
 import json
+import logging
 import re
 import time
 from dataclasses import dataclass
@@ -241,7 +242,8 @@ class LMFWCClient:
         path = f"/wp-json/lmfwc/v2/licenses/activate/{license_key}"
         params = {"token": token.strip()} if token else None
         resp = self._get(path, params=params)
-        LOG.info(f"activate: response={_compact(resp)}")
+        if LOG.isEnabledFor(logging.INFO):
+            LOG.info("activate: response=%s", _compact(resp))
         return resp
 
     def reactivate(self, license_key: str, token: str, *, idempotent_window_s: int = 8) -> Dict[str, Any]:
@@ -257,7 +259,8 @@ class LMFWCClient:
         path = f"/wp-json/lmfwc/v2/licenses/deactivate/{license_key}"
         params = {"token": token.strip()} if token else None
         resp = self._get(path, params=params)
-        LOG.info(f"deactivate: response={_compact(resp)}")
+        if LOG.isEnabledFor(logging.INFO):
+            LOG.info("deactivate: response=%s", _compact(resp))
         return resp
 
     def validate(self, license_key: str) -> Dict[str, Any]:
@@ -265,7 +268,8 @@ class LMFWCClient:
         LOG.info(f"validate: lk={license_key!r}")
         path = f"/wp-json/lmfwc/v2/licenses/validate/{license_key}"
         resp = self._get(path)
-        LOG.info(f"validate: response={_compact(resp)}")
+        if LOG.isEnabledFor(logging.INFO):
+            LOG.info("validate: response=%s", _compact(resp))
         return resp
 
     # ---------------------
@@ -299,7 +303,11 @@ class LMFWCClient:
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         url = f"{self.base_url}{path}"
         auth = HTTPBasicAuth(self.consumer_key or "", self.consumer_secret or "")
-        LOG.info(f"HTTP GET {url} params={_compact(params)} verify_tls={self.verify_tls} timeout={self.timeout_seconds}")
+        if LOG.isEnabledFor(logging.INFO):
+            LOG.info(
+                "HTTP GET %s params=%s verify_tls=%s timeout=%s",
+                url, _compact(params), self.verify_tls, self.timeout_seconds,
+            )
 
         attempt = 0
         last_exc: Optional[Exception] = None
@@ -373,7 +381,8 @@ class LMFWCClient:
             return body  # happy path
 
         # Pattern B: some validate endpoints may return a shortened object; still pass through
-        LOG.info(f"handle_response: non-wrapper body={_compact(body)}")
+        if LOG.isEnabledFor(logging.INFO):
+            LOG.info("handle_response: non-wrapper body=%s", _compact(body))
         return body
 
     @staticmethod
@@ -0,0 +1,10 @@
+import frappe
+
+# Liste uç noktalarının cursor sayfalaması (modified, name) üzerinden sıralar/süzer
+_DOCTYPES = ("HD Ticket", "HD Article", "Problem Ticket")
+
+
+def execute():
+    for doctype in _DOCTYPES:
+        if frappe.db.table_exists(doctype):
+            frappe.db.add_index(doctype, ["modified", "name"])